@@ -0,0 +1,91 @@
+import numpy as np
+from llama_cpp import Llama
+
+from batch_runner import BatchedGenerator
+
+
+# ----------------- Enum Argument Scoring ----------------- #
+
+# Room per candidate for its value tokens and the closing delimiter
+MAX_VALUE_TOKENS = 32
+
+
+class EnumArgumentScorer(BatchedGenerator):
+    """Pick each enum parameter's value by log-likelihood instead of generating it
+
+    For a prompt and function name, each enum parameter is scored on its own:
+    the call text up to the parameter's value (argument_prefix(function,
+    parameter)) is the shared prefix, and every allowed value followed by
+    closer is one sequence. The prefix is evaluated once with every sequence
+    id attached, then all candidates are decoded together in one batch.
+    Only the part of the prefix not already in the KV cache is evaluated,
+    so the prompt itself is prefilled once per test, not once per parameter.
+    """
+
+    def __init__(self, llm: Llama, tools_list, argument_prefix, closer, n_threads=None, n_ctx=None):
+        # Allowed values per enum parameter, in schema order (which breaks ties)
+        self.enums = {}
+        for tool in tools_list:
+            function = tool["function"]
+            self.enums[function["name"]] = {
+                name: list(prop["enum"])
+                for name, prop in function["parameters"].get("properties", {}).items()
+                if "enum" in prop
+            }
+        n_seq_max = max((len(values) for enums in self.enums.values() for values in enums.values()), default=1)
+        super().__init__(llm, n_seq_max, MAX_VALUE_TOKENS, n_threads=n_threads, n_ctx=n_ctx)
+        self.argument_prefix = argument_prefix
+        self.closer = closer
+
+    def _log_probs(self, row):
+        logits = np.ctypeslib.as_array(self.ctx.get_logits_ith(row), shape=(self.n_vocab,)).astype(np.float64)
+        logits -= logits.max()
+        return logits - np.log(np.exp(logits).sum())
+
+    def log_likelihoods(self, prefix, continuations):
+        """Log-likelihood of each continuation after prefix"""
+        prefix_tokens = self.llm.tokenize(prefix.encode("utf-8"), add_bos=True, special=True)
+        # Tokenized together, because a continuation can merge with the end of the prefix
+        full_tokens = [
+            self.llm.tokenize((prefix + continuation).encode("utf-8"), add_bos=True, special=True)
+            for continuation in continuations
+        ]
+        n_shared = min(Llama.longest_token_prefix(prefix_tokens, tokens) for tokens in full_tokens)
+        # Whatever the previous call left of this prefix is kept
+        first = self._attach_prefix(prefix_tokens[:n_shared], read=self._log_probs)
+
+        # Every candidate token but the last needs logits for the token after it
+        entries = []
+        for seq_id, tokens in enumerate(full_tokens):
+            rest = tokens[n_shared:]
+            for offset, token in enumerate(rest):
+                entries.append((token, n_shared + offset, [seq_id], offset < len(rest) - 1))
+        rows = self._decode(entries, read=self._log_probs)
+
+        scores = []
+        k = 0
+        for tokens in full_tokens:
+            rest = tokens[n_shared:]
+            score = first[rest[0]]
+            for offset in range(1, len(rest)):
+                score += rows[k + offset - 1][rest[offset]]
+            k += len(rest)
+            scores.append(float(score))
+        return scores
+
+    def score(self, prompt, function_name):
+        """{parameter: {"choice", "margin", "log_likelihoods"}} for function_name's enum parameters
+
+        margin is the log-likelihood gap between the best and second-best value.
+        """
+        results = {}
+        for parameter, values in self.enums.get(function_name, {}).items():
+            prefix = prompt + self.argument_prefix(function_name, parameter)
+            scores = self.log_likelihoods(prefix, [value + self.closer for value in values])
+            ranked = sorted(range(len(values)), key=lambda i: -scores[i])
+            results[parameter] = {
+                "choice": values[ranked[0]],
+                "margin": scores[ranked[0]] - scores[ranked[1]] if len(values) > 1 else None,
+                "log_likelihoods": dict(zip(values, scores)),
+            }
+        return results
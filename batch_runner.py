@@ -0,0 +1,194 @@
+import time
+
+import numpy as np
+import llama_cpp
+from llama_cpp import Llama
+from llama_cpp import _internals as internals
+
+
+# ----------------- Batched Multi-Sequence Decoding ----------------- #
+
+# Context size to load the Llama with when only a BatchedGenerator decodes:
+# the Llama's own context is then used for nothing but tokenizing
+TOKENIZER_N_CTX = 64
+
+class BatchedGenerator:
+    """Decode several prompts that share a prefix together in one llama.cpp context
+
+    The prefix is evaluated once with every sequence id attached, so all
+    sequences share its KV cells, and it stays cached for the next batch.
+    Every decode step then carries one token per active sequence, so the
+    matmuls run on a batch instead of a single row. Sampling is greedy (the
+    suites run at temperature 0.1, which is close to greedy).
+
+    The generator has its own context with room for one prompt of n_ctx
+    tokens (default: llm's n_ctx) plus max_tokens per sequence, so llm can be
+    loaded with a tiny context (TOKENIZER_N_CTX) and used only to tokenize.
+    """
+
+    def __init__(self, llm: Llama, n_seq_max, max_tokens, n_threads=None, n_ctx=None):
+        self.llm = llm
+        self.n_seq_max = n_seq_max
+        self.max_tokens = max_tokens
+        self.n_vocab = llm.n_vocab()
+
+        # Tokens that end a sequence: EOS plus Gemma's <end_of_turn>
+        self.eog_tokens = {llm.token_eos()}
+        end_of_turn = llm.tokenize(b"<end_of_turn>", add_bos=False, special=True)
+        if len(end_of_turn) == 1:
+            self.eog_tokens.add(end_of_turn[0])
+
+        # Room for one prompt plus max_tokens per sequence
+        params = llama_cpp.llama_context_params.from_buffer_copy(llm.context_params)
+        params.n_seq_max = n_seq_max
+        params.n_ctx = (n_ctx or llm.n_ctx()) + n_seq_max * max_tokens
+        params.n_batch = params.n_ubatch = max(512, n_seq_max)
+        params.logits_all = False
+        if hasattr(params, "kv_unified"):
+            # One KV buffer for all sequences, so the prefix cells can be shared
+            params.kv_unified = True
+        if n_threads:
+            params.n_threads = params.n_threads_batch = n_threads
+        self.n_batch = params.n_batch
+        self.ctx = internals.LlamaContext(model=llm._model, params=params, verbose=llm.verbose)
+        self.batch = internals.LlamaBatch(n_tokens=self.n_batch, embd=0, n_seq_max=n_seq_max, verbose=llm.verbose)
+        self._cached_tokens = []
+
+    def _add(self, token, pos, seq_ids, logits):
+        """Append one token to the batch (llama.cpp's common_batch_add)"""
+        batch = self.batch.batch
+        i = batch.n_tokens
+        batch.token[i] = token
+        batch.pos[i] = pos
+        batch.n_seq_id[i] = len(seq_ids)
+        for j, seq_id in enumerate(seq_ids):
+            batch.seq_id[i][j] = seq_id
+        batch.logits[i] = logits
+        batch.n_tokens += 1
+        return i
+
+    def _decode(self, entries, read=None):
+        """Decode (token, pos, seq_ids, logits) entries in n_batch chunks
+
+        Returns {entry index: read(logits row)} for entries that requested
+        logits; by default read() picks the greedy next token.
+        """
+        read = read or self._next_token
+        rows = {}
+        for start in range(0, len(entries), self.n_batch):
+            self.batch.reset()
+            chunk_rows = {}
+            for k, (token, pos, seq_ids, logits) in enumerate(entries[start:start + self.n_batch], start):
+                row = self._add(token, pos, seq_ids, logits)
+                if logits:
+                    chunk_rows[k] = row
+            self.ctx.decode(self.batch)
+            # Logits are only valid until the next decode, so read them now
+            for k, row in chunk_rows.items():
+                rows[k] = read(row)
+        return rows
+
+    def _attach_prefix(self, tokens, read=None):
+        """Make tokens the prefix of every sequence, evaluating only what the cache doesn't already hold
+
+        Cells past the longest prefix shared with the previous call are
+        dropped. With read set, the last token is always evaluated and
+        read(its logits row) is returned.
+        """
+        n_keep = Llama.longest_token_prefix(self._cached_tokens, tokens)
+        if read:
+            n_keep = min(n_keep, len(tokens) - 1)
+        # The wrapper maps seq_id -1 to sequence 0, so each one is trimmed
+        if not all(self.ctx.kv_cache_seq_rm(seq_id, n_keep, -1) for seq_id in range(self.n_seq_max)):
+            self.ctx.kv_cache_clear()
+            n_keep = 0
+        # Attached to every sequence id, so a later call with more sequences can reuse it too
+        seq_ids = list(range(self.n_seq_max))
+        last = len(tokens) - 1
+        entries = [(token, pos, seq_ids, bool(read) and pos == last) for pos, token in enumerate(tokens) if pos >= n_keep]
+        rows = self._decode(entries, read=read)
+        self._cached_tokens = list(tokens)
+        return rows[len(entries) - 1] if read else None
+
+    def _next_token(self, row):
+        logits = np.ctypeslib.as_array(self.ctx.get_logits_ith(row), shape=(self.n_vocab,))
+        return int(np.argmax(logits))
+
+    def generate(self, prefix, suffixes, stop=()):
+        """Generate a completion for prefix + each suffix
+
+        Returns one dict per suffix with text, completion_tokens,
+        time_to_first_token and latency (seconds since the batch started),
+        plus the aggregate tokens/s for the whole batch.
+        """
+        assert len(suffixes) <= self.n_seq_max
+        start = time.time()
+
+        prefix_tokens = self.llm.tokenize(prefix.encode("utf-8"), add_bos=True, special=True)
+        n_prefix = len(prefix_tokens)
+
+        # Shared prefix: evaluated once per prefix, not once per batch
+        self._attach_prefix(prefix_tokens)
+        seq_ids = list(range(len(suffixes)))
+
+        # Per-sequence suffixes, with logits only for each suffix's last token
+        entries = []
+        last_entry = []
+        positions = []
+        for seq_id, suffix in enumerate(suffixes):
+            suffix_tokens = self.llm.tokenize(suffix.encode("utf-8"), add_bos=False, special=True)
+            for offset, token in enumerate(suffix_tokens):
+                is_last = offset == len(suffix_tokens) - 1
+                entries.append((token, n_prefix + offset, [seq_id], is_last))
+            last_entry.append(len(entries) - 1)
+            positions.append(n_prefix + len(suffix_tokens))
+        next_tokens = self._decode(entries)
+        next_token = {seq_id: next_tokens[k] for seq_id, k in enumerate(last_entry)}
+
+        outputs = [
+            {"tokens": [], "text": "", "time_to_first_token": None, "latency": None}
+            for _ in suffixes
+        ]
+        active = set(seq_ids)
+        total_tokens = 0
+
+        while active:
+            now = time.time() - start
+            entries = []
+            for seq_id in sorted(active):
+                output = outputs[seq_id]
+                token = next_token[seq_id]
+                if output["time_to_first_token"] is None:
+                    output["time_to_first_token"] = now
+
+                finished = token in self.eog_tokens
+                if not finished:
+                    output["tokens"].append(token)
+                    total_tokens += 1
+                    output["text"] = self.llm.detokenize(output["tokens"], special=True).decode("utf-8", errors="ignore")
+                    for s in stop:
+                        if s in output["text"]:
+                            output["text"] = output["text"][:output["text"].index(s)]
+                            finished = True
+                    if len(output["tokens"]) >= self.max_tokens:
+                        finished = True
+
+                if finished:
+                    output["latency"] = now
+                    active.discard(seq_id)
+                    # Free this sequence's cells (the shared prefix stays for the others)
+                    self.ctx.kv_cache_seq_rm(seq_id, n_prefix, -1)
+                else:
+                    entries.append((token, positions[seq_id], [seq_id], True))
+                    positions[seq_id] += 1
+
+            if entries:
+                rows = self._decode(entries)
+                for k, (_, _, (seq_id,), _) in enumerate(entries):
+                    next_token[seq_id] = rows[k]
+
+        elapsed = time.time() - start
+        for output in outputs:
+            output["completion_tokens"] = len(output.pop("tokens"))
+        batch_tokens_per_second = total_tokens / elapsed if elapsed > 0 else 0.0
+        return outputs, batch_tokens_per_second
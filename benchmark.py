@@ -0,0 +1,129 @@
+import contextlib
+import io
+import json
+
+import numpy as np
+
+from metrics import percentiles
+from result_sink import iter_results
+
+
+# ----------------- Benchmark Mode ----------------- #
+
+def repeat_tests(load_test_cases, repeats, seed):
+    """Yield every test case repeats times, each repetition with its own seed
+
+    Repetitions are interleaved (all tests, then all tests again), re-reading
+    the tests from load_test_cases() each pass. Back to back, a repeat would
+    share its whole prompt with the run before it, so Llama.generate() would
+    skip its prefill and bias the latencies low. The first repetition keeps
+    the suite's seed, so it matches a normal run.
+    """
+    for repeat in range(repeats):
+        for test in load_test_cases():
+            yield dict(test, repeat=repeat, seed=seed + repeat)
+
+
+def warm_up(run, test, iterations):
+    """Run a test iterations times with its output discarded, to pay cold-start costs up front"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(iterations):
+            run(test)
+
+
+def bootstrap_ci(values, confidence=0.95, resamples=2000, seed=0):
+    """Percentile bootstrap confidence interval for the mean of values"""
+    values = np.asarray(values, dtype=float)
+    rng = np.random.default_rng(seed)
+    means = rng.choice(values, size=(resamples, len(values)), replace=True).mean(axis=1)
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(means, [alpha, 1 - alpha])
+    return float(low), float(high)
+
+
+def describe(values):
+    """Mean, stdev, p50/p95/p99 and a 95% bootstrap CI of the mean"""
+    stats = percentiles(values)
+    ci_low, ci_high = bootstrap_ci(values)
+    return {
+        "mean": float(np.mean(values)),
+        "stdev": float(np.std(values, ddof=1)) if len(values) > 1 else 0.0,
+        "p50": float(stats[50]),
+        "p95": float(stats[95]),
+        "p99": float(stats[99]),
+        "ci_low": ci_low,
+        "ci_high": ci_high,
+    }
+
+
+def summarize_benchmark(details_path):
+    """Latency and pass-rate statistics over every repetition in a results file, or None if it is empty"""
+    latencies = []
+    passed = []
+    for detail in iter_results(details_path):
+        latencies.append(detail["time"])
+        passed.append(1.0 if detail["passed"] else 0.0)
+    if not latencies:
+        return None
+    return {"runs": len(latencies), "latency": describe(latencies), "pass_rate": describe(passed)}
+
+
+# ----------------- Baselines & Regressions ----------------- #
+
+def save_baseline(report, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+
+def load_baseline(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def find_regressions(report, baseline, threshold):
+    """Compare a benchmark report against a baseline
+
+    Latency regresses when the mean rises by more than threshold (relative)
+    and the baseline mean falls below the current 95% CI. Pass rate regresses
+    when it drops by more than threshold (relative) and the baseline mean lies
+    above the current CI. Requiring both keeps run-to-run noise from being flagged.
+    """
+    regressions = []
+
+    latency, base_latency = report["latency"], baseline["latency"]
+    if latency["mean"] > base_latency["mean"] * (1 + threshold) and latency["ci_low"] > base_latency["mean"]:
+        regressions.append(
+            f"latency: mean {latency['mean']:.3f}s vs baseline {base_latency['mean']:.3f}s "
+            f"(+{(latency['mean'] / base_latency['mean'] - 1) * 100:.1f}%)"
+        )
+
+    pass_rate, base_pass_rate = report["pass_rate"], baseline["pass_rate"]
+    if pass_rate["mean"] < base_pass_rate["mean"] * (1 - threshold) and pass_rate["ci_high"] < base_pass_rate["mean"]:
+        regressions.append(
+            f"pass rate: {pass_rate['mean'] * 100:.1f}% vs baseline {base_pass_rate['mean'] * 100:.1f}%"
+        )
+
+    return regressions
+
+
+def print_benchmark_report(report, baseline=None, regressions=()):
+    """Print the benchmark statistics, side by side with the baseline if one was given"""
+    print("\n" + "=" * 80)
+    print(f"BENCHMARK ({report['runs']} timed runs)")
+    print("=" * 80)
+    latency = report["latency"]
+    print(f"Latency: mean {latency['mean']:.3f}s ± {latency['stdev']:.3f}s "
+          f"(95% CI {latency['ci_low']:.3f}-{latency['ci_high']:.3f}s)")
+    print(f"         p50 {latency['p50']:.3f}s / p95 {latency['p95']:.3f}s / p99 {latency['p99']:.3f}s")
+    pass_rate = report["pass_rate"]
+    print(f"Pass Rate: {pass_rate['mean'] * 100:.1f}% ± {pass_rate['stdev'] * 100:.1f} "
+          f"(95% CI {pass_rate['ci_low'] * 100:.1f}-{pass_rate['ci_high'] * 100:.1f}%)")
+
+    if baseline:
+        print(f"Baseline: latency mean {baseline['latency']['mean']:.3f}s, "
+              f"pass rate {baseline['pass_rate']['mean'] * 100:.1f}%")
+        if regressions:
+            for regression in regressions:
+                print(f"✗ REGRESSION - {regression}")
+        else:
+            print("✓ No regressions against baseline")
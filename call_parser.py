@@ -0,0 +1,313 @@
+# ----------------- Incremental Call Parsers ----------------- #
+
+class _CallParser:
+    """Base class for incremental function-call parsers
+
+    Text is fed in chunks as it streams from the model. Each character is
+    looked at once: the parser scans for OPEN, then walks the call with a
+    small state machine and sets complete as soon as the call closes.
+    """
+
+    OPEN = None
+
+    def __init__(self):
+        self.started = False   # call opener seen
+        self.complete = False  # call closed
+        self.failed = False    # opener seen but what followed is not a call
+        self.name = None
+        self.arguments = {}
+        self._tail = ""        # end of the text so far, may hold a partial opener
+        self._state = None
+        self._buf = ""
+        self._key = None
+        self._depth = 0
+        self._quote = None
+        self._escaped = False
+
+    @property
+    def done(self):
+        """Whether further text can no longer change the result"""
+        return self.complete or self.failed
+
+    def may_start(self):
+        """Whether the text so far ends with a partial opener"""
+        return bool(self._tail) and self.OPEN.startswith(self._tail)
+
+    def feed(self, chunk):
+        """Consume the next piece of output; returns True once the call is complete"""
+        if self.done:
+            return self.complete
+
+        if not self.started:
+            text = self._tail + chunk
+            open_idx = text.find(self.OPEN)
+            if open_idx == -1:
+                # Keep only the longest suffix that could still begin the opener
+                self._tail = ""
+                for i in range(min(len(self.OPEN) - 1, len(text)), 0, -1):
+                    if self.OPEN.startswith(text[-i:]):
+                        self._tail = text[-i:]
+                        break
+                return False
+            self.started = True
+            self._tail = ""
+            self._state = self._START
+            chunk = text[open_idx + len(self.OPEN):]
+
+        for ch in chunk:
+            self._step(ch)
+            if self.done:
+                break
+        return self.complete
+
+    def result(self):
+        """(function_name, arguments) parsed so far, or (None, None) if there is no call"""
+        if self.failed or not self.name:
+            return None, None
+        return self.name, self.arguments
+
+    def _store(self, value):
+        if self._key:
+            self.arguments[self._key] = value.strip()
+        self._key = None
+        self._buf = ""
+
+    def _fail(self):
+        self.failed = True
+
+    def _finish(self):
+        self.complete = True
+
+
+class FunctionGemmaCallParser(_CallParser):
+    """Parse <start_function_call>call:name{key:<escape>value<escape>,...}"""
+
+    OPEN = "<start_function_call>"
+    ESCAPE = "<escape>"
+
+    _START, _NAME, _AFTER_NAME, _KEY, _VALUE_START, _ESCAPED, _RAW, _AFTER_VALUE = range(8)
+
+    def _step(self, ch):
+        state = self._state
+
+        if state == self._START:
+            if ch.isspace() and not self._buf:
+                return
+            self._buf += ch
+            if self._buf == "call:":
+                self._buf = ""
+                self._state = self._NAME
+            elif not "call:".startswith(self._buf):
+                self._fail()
+
+        elif state == self._NAME:
+            if ch.isspace() and not self._buf:
+                # call: name
+                return
+            if ch == "{":
+                self.name = self._buf
+                self._buf = ""
+                self._state = self._KEY
+            elif ch == "<":
+                # call:name with no argument braces
+                self._finish()
+            elif ch.isspace():
+                self._state = self._AFTER_NAME
+            else:
+                self._buf += ch
+                self.name = self._buf
+
+        elif state == self._AFTER_NAME:
+            # call:name {...}, or call:name with no argument braces
+            if ch == "{":
+                self._buf = ""
+                self._state = self._KEY
+            elif not ch.isspace():
+                self._finish()
+
+        elif state == self._KEY:
+            if ch == "}" and not self._buf.strip():
+                self._finish()
+            elif ch == "," and not self._buf.strip():
+                self._buf = ""
+            elif ch == ":":
+                self._key = self._buf.strip()
+                self._buf = ""
+                self._state = self._VALUE_START
+            else:
+                self._buf += ch
+
+        elif state == self._VALUE_START:
+            self._buf += ch
+            if self._buf == self.ESCAPE:
+                self._buf = ""
+                self._state = self._ESCAPED
+            elif not self.ESCAPE.startswith(self._buf):
+                # Not an escaped string: replay the buffered characters as a raw value
+                pending, self._buf = self._buf, ""
+                self._depth = 0
+                self._state = self._RAW
+                for c in pending:
+                    self._step(c)
+                    if self.done:
+                        break
+
+        elif state == self._ESCAPED:
+            self._buf += ch
+            if self._buf.endswith(self.ESCAPE):
+                self._store(self._buf[:-len(self.ESCAPE)])
+                self._state = self._AFTER_VALUE
+
+        elif state == self._RAW:
+            if ch in "{[":
+                self._depth += 1
+            elif ch in "]}" and self._depth:
+                self._depth -= 1
+            elif ch in ",}" and not self._depth:
+                self._store(self._buf)
+                if ch == "}":
+                    self._finish()
+                else:
+                    self._state = self._KEY
+                return
+            self._buf += ch
+
+        elif state == self._AFTER_VALUE:
+            if ch == "}":
+                self._finish()
+            elif ch == ",":
+                self._state = self._KEY
+            elif not ch.isspace():
+                self._buf = ch
+                self._state = self._KEY
+
+
+class ToolCodeCallParser(_CallParser):
+    """Parse ```tool_code name(key="value", ...) blocks (Gemma 3 Python-call format)
+
+    Like the regex it replaced, a dotted name keeps only its last component
+    (default_api.get_weather -> get_weather) and a leading assignment
+    (result = name(...)) is skipped. A call wrapped in another, as in
+    print(get_weather(...)), is parsed as the inner call. Keys must be
+    identifiers, otherwise the parse fails.
+    """
+
+    OPEN = "```tool_code"
+
+    _START, _NAME, _OPEN_PAREN, _KEY, _VALUE_START, _STRING, _RAW, _AFTER_VALUE = range(8)
+
+    def _step(self, ch):
+        state = self._state
+
+        if state == self._START:
+            if ch.isspace():
+                return
+            if ch.isalpha() or ch == "_":
+                self._buf = ch
+                self._state = self._NAME
+            else:
+                self._fail()
+
+        elif state == self._NAME:
+            if ch.isalnum() or ch in "_.":
+                self._buf += ch
+            elif ch == "(":
+                self._open_call()
+            elif ch.isspace():
+                self._state = self._OPEN_PAREN
+            elif ch == "=":
+                self._state = self._START
+            else:
+                self._fail()
+
+        elif state == self._OPEN_PAREN:
+            if ch == "(":
+                self._open_call()
+            elif ch == "=":
+                # Assignment target: the call follows
+                self._state = self._START
+            elif not ch.isspace():
+                self._fail()
+
+        elif state == self._KEY:
+            key = self._buf.strip()
+            if ch == "=":
+                if not key.isidentifier():
+                    self._fail()
+                    return
+                self._key = key
+                self._buf = ""
+                self._state = self._VALUE_START
+            elif ch in "\"'" and not key:
+                # Positional string argument: parsed, but not stored
+                self._key = None
+                self._quote = ch
+                self._escaped = False
+                self._state = self._STRING
+            elif ch == "(" and key and not self.arguments and all(part.isidentifier() for part in key.split(".")):
+                # The call is wrapped in another, e.g. print(default_api.get_weather(...)): descend into it
+                self._open_call()
+            elif ch in ",)":
+                # Positional name or number (or trailing comma): skipped
+                self._buf = ""
+                if ch == ")":
+                    self._finish()
+            elif ch.isalnum() or ch in "_." or ch.isspace():
+                self._buf += ch
+            elif not key:
+                # Other positional raw argument, e.g. a list: skipped
+                self._key = None
+                self._depth = 0
+                self._state = self._RAW
+                self._step(ch)
+            else:
+                self._fail()
+
+        elif state == self._VALUE_START:
+            if ch.isspace():
+                return
+            if ch in "\"'":
+                self._quote = ch
+                self._escaped = False
+                self._state = self._STRING
+            else:
+                self._depth = 0
+                self._state = self._RAW
+                self._step(ch)
+
+        elif state == self._STRING:
+            if self._escaped:
+                self._buf += ch
+                self._escaped = False
+            elif ch == "\\":
+                self._escaped = True
+            elif ch == self._quote:
+                self._store(self._buf)
+                self._state = self._AFTER_VALUE
+            else:
+                self._buf += ch
+
+        elif state == self._RAW:
+            if ch in "([{":
+                self._depth += 1
+            elif ch in ")]}" and self._depth:
+                self._depth -= 1
+            elif ch in ",)" and not self._depth:
+                self._store(self._buf)
+                if ch == ")":
+                    self._finish()
+                else:
+                    self._state = self._KEY
+                return
+            self._buf += ch
+
+        elif state == self._AFTER_VALUE:
+            if ch == ")":
+                self._finish()
+            elif ch == ",":
+                self._state = self._KEY
+
+    def _open_call(self):
+        self.name = self._buf.rsplit(".", 1)[-1]
+        self._buf = ""
+        self._state = self._KEY
@@ -0,0 +1,60 @@
+import collections
+import hashlib
+import json
+import os
+
+from result_sink import iter_results
+
+
+# ----------------- Resumable Runs ----------------- #
+
+def _sha256(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class Checkpoint:
+    """Index of completed tests, keyed by (model path, prompt hash, test id, sampling params)
+
+    Each result written to the sink carries its checkpoint_key, so the index
+    is rebuilt on restart by streaming over the sink file: a result that was
+    never flushed before a crash is simply run again.
+    """
+
+    def __init__(self, suite, sampling_params, details_path=None):
+        self.model_path = os.path.abspath(suite.MODEL_PATH)
+        self.prefix_hash = _sha256(suite.prompt_prefix)
+        self.build_prompt_suffix = suite.build_prompt_suffix
+        self.sampling_params = json.dumps(sampling_params, sort_keys=True)
+        self.completed = set()
+        self.skipped = 0
+        self._pending_keys = collections.deque()
+
+        if details_path and os.path.exists(details_path):
+            for detail in iter_results(details_path):
+                if "checkpoint_key" in detail:
+                    self.completed.add(detail["checkpoint_key"])
+
+    def key(self, test):
+        """Checkpoint key for one test case"""
+        prompt_hash = _sha256(self.prefix_hash + self.build_prompt_suffix(test))
+        test_id = [test["name"], test["query"]]
+        return _sha256(json.dumps([self.model_path, prompt_hash, test_id, self.sampling_params]))
+
+    def pending(self, test_cases):
+        """Yield only the tests that have not completed yet"""
+        for test in test_cases:
+            key = self.key(test)
+            if key in self.completed:
+                self.skipped += 1
+                continue
+            self._pending_keys.append(key)
+            yield test
+
+    def tag(self, result_detail):
+        """Attach the checkpoint key to a result
+
+        Every runner returns results in the order pending() handed out tests,
+        so the keys are matched up first in, first out.
+        """
+        result_detail["checkpoint_key"] = self._pending_keys.popleft()
+        return result_detail
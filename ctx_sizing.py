@@ -0,0 +1,76 @@
+import time
+
+from llama_cpp import Llama
+
+from model_registry import registry
+
+
+# ----------------- Context Right-Sizing ----------------- #
+
+def round_up(n, multiple=256):
+    """Round n up to a multiple (llama.cpp pads the KV cache to 256 cells anyway)"""
+    return -(-n // multiple) * multiple
+
+
+def kv_bytes_per_token(metadata):
+    """Bytes of f16 K and V cache per context token, from a model's GGUF metadata
+
+    Counts every layer as full attention, so for models with sliding-window
+    layers (Gemma 3) this is an upper bound.
+    """
+    arch = metadata["general.architecture"]
+    n_layer = int(metadata[f"{arch}.block_count"])
+    n_head = int(metadata[f"{arch}.attention.head_count"])
+    n_head_kv = int(metadata.get(f"{arch}.attention.head_count_kv", n_head))
+    head_dim = int(metadata[f"{arch}.embedding_length"]) // n_head
+    key_length = int(metadata.get(f"{arch}.attention.key_length", head_dim))
+    value_length = int(metadata.get(f"{arch}.attention.value_length", head_dim))
+    return n_layer * n_head_kv * (key_length + value_length) * 2
+
+
+def size_context(model_path, prefix, suffixes, generation_budget):
+    """Smallest padded n_ctx that fits the longest prefix + suffix prompt plus generation_budget
+
+    Only the vocabulary is loaded, so this costs a tokenizer pass, not a
+    model load. suffixes may be a generator. Returns n_ctx, the longest
+    prompt's token count and the KV cache bytes per context token.
+    """
+    vocab = Llama(model_path=model_path, vocab_only=True, verbose=False)
+    try:
+        n_prefix = len(vocab.tokenize(prefix.encode("utf-8"), add_bos=True, special=True))
+        n_suffix = max(
+            (len(vocab.tokenize(suffix.encode("utf-8"), add_bos=False, special=True)) for suffix in suffixes),
+            default=0,
+        )
+        kv_per_token = kv_bytes_per_token(vocab.metadata)
+    finally:
+        vocab.close()
+    prompt_tokens = n_prefix + n_suffix
+    return {
+        "n_ctx": round_up(prompt_tokens + generation_budget),
+        "prompt_tokens": prompt_tokens,
+        "kv_bytes_per_token": kv_per_token,
+    }
+
+
+def time_load(load_model, n_ctx):
+    """Seconds for a fresh load_model(n_ctx=n_ctx); the model is closed again"""
+    registry.clear()
+    start = time.time()
+    load_model(n_ctx=n_ctx)
+    elapsed = time.time() - start
+    registry.clear()
+    return elapsed
+
+
+def compare_load_times(load_model, n_ctx_before, n_ctx_after):
+    """Load times at the original and the right-sized n_ctx, through the suite's own load_model
+
+    Meant to run after the tests, when the weights are already in the page
+    cache, so the two loads differ only by the context setup. Closes every
+    pooled model.
+    """
+    return {
+        "load_time_before": time_load(load_model, n_ctx_before),
+        "load_time_after": time_load(load_model, n_ctx_after),
+    }
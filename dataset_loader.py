@@ -0,0 +1,40 @@
+import gzip
+import json
+
+
+# ----------------- JSONL Test Case Datasets ----------------- #
+
+def normalize_test_case(record, line_number):
+    """Fill in the test case fields the runner expects"""
+    expected_function = record.get("expected_function")
+    test = {
+        "name": record.get("name") or f"Test {line_number}",
+        "query": record["query"],
+        "expected_function": expected_function,
+        "type": record.get("type") or ("function_call" if expected_function else "conversation"),
+    }
+    if "expected_arguments" in record:
+        test["expected_arguments"] = record["expected_arguments"]
+    return test
+
+
+def load_test_cases(path):
+    """Lazily yield test cases from a .jsonl or .jsonl.gz file, one JSON object per line
+
+    Each line has the same fields as the built-in test_cases (name, query,
+    expected_function, type) plus optional expected_arguments. Only the
+    current line is held in memory.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_number}: invalid JSON ({e})") from e
+            if "query" not in record:
+                raise ValueError(f"{path}:{line_number}: test case has no 'query'")
+            yield normalize_test_case(record, line_number)
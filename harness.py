@@ -0,0 +1,821 @@
+import argparse
+import collections
+import functools
+import itertools
+import os
+import time
+
+from batch_runner import TOKENIZER_N_CTX, BatchedGenerator
+from benchmark import (find_regressions, load_baseline, print_benchmark_report, repeat_tests,
+                       save_baseline, summarize_benchmark, warm_up)
+from checkpoint import Checkpoint
+from ctx_sizing import compare_load_times, size_context
+from dataset_loader import load_test_cases
+from intent_router import IntentRouter
+from memory_tracker import MemorySampler
+from metrics import LATENCY_FIELDS, percentiles, roc_auc, roc_curve
+from parallel_runner import run_parallel, threads_per_worker
+from pipeline import run_pipelined
+from result_sink import ResultSink, export_json, iter_results, summarize
+from tool_executor import build_executor
+
+
+# ----------------- Scoring ----------------- #
+
+def print_test_header(test):
+    """Print the banner for a test case"""
+    print(f"\n{'=' * 80}")
+    print(f"{test['name']}")
+    print(f"{'=' * 80}")
+    print(f"Query: {test['query']}")
+    print(f"Expected: {'Function call to ' + test['expected_function'] if test['expected_function'] else 'Normal conversation'}")
+    print()
+
+
+def score_test(test, assistant_content, inference_time, function_name, arguments, execute_function_call,
+               schema_index=None):
+    """Execute the extracted call (if any) and decide whether the test passed
+
+    With a ToolSchemaIndex the call is also checked against tools_list, and
+    with expected_arguments on the test its arguments are compared. Neither
+    changes the pass/fail verdict, which is about the function chosen.
+    """
+    test_passed = False
+    result_detail = {
+        "test_name": test['name'],
+        "query": test['query'],
+        "output": assistant_content,
+        "time": inference_time,
+    }
+    if "repeat" in test:
+        result_detail["repeat"] = test["repeat"]
+
+    if function_name:
+        print(f"✓ Function detected: {function_name}")
+        print(f"✓ Arguments: {arguments}")
+        if schema_index:
+            call_errors = schema_index.validate(function_name, arguments)
+            for kind, detail in call_errors:
+                print(f"⚠ Schema check: {kind} ({detail})")
+            result_detail["call_errors"] = call_errors
+        if "expected_arguments" in test:
+            result_detail["arguments_correct"] = all(
+                arguments.get(name) == value for name, value in test["expected_arguments"].items()
+            )
+
+        try:
+            func_result = execute_function_call(function_name, arguments)
+            print(f"\nFunction execution result:")
+            print(func_result)
+            result_detail["function_called"] = function_name
+            result_detail["arguments"] = arguments
+            result_detail["function_result"] = func_result
+        except Exception as e:
+            print(f"\n✗ Function execution failed: {e}")
+            result_detail["error"] = str(e)
+
+        if test['type'] == 'function_call' and function_name == test['expected_function']:
+            test_passed = True
+            print(f"\n✓ TEST PASSED - Correct function called")
+        elif test['type'] == 'conversation':
+            test_passed = False
+            print(f"\n✗ TEST FAILED - Function called when conversation expected")
+        else:
+            test_passed = False
+            print(f"\n✗ TEST FAILED - Wrong function (expected: {test['expected_function']})")
+    else:
+        print("ℹ No function call detected - treating as normal conversation")
+        print(f"Response: {assistant_content}")
+        result_detail["conversation_response"] = assistant_content
+
+        if test['type'] == 'conversation':
+            test_passed = True
+            print(f"\n✓ TEST PASSED - Normal conversation as expected")
+        else:
+            test_passed = False
+            print(f"\n✗ TEST FAILED - Expected function call to {test['expected_function']}")
+
+    result_detail["passed"] = test_passed
+    return result_detail
+
+
+def score_routed(test, routing):
+    """Score a test the intent router sent straight to a conversation verdict"""
+    print(f"⚡ Intent router: conversation (confidence {routing['router_confidence']:.2f}), model skipped")
+    result_detail = score_test(test, "", routing["router_time"], None, None, None)
+    result_detail.update(routing)
+    return result_detail
+
+
+def score_probe(test, score, inference_time, threshold=0.5):
+    """Score a test from the softmax score of the token that opens a function call
+
+    Only the call-or-conversation decision is judged: no function name or
+    arguments are generated. The score is uncalibrated, so the summary picks
+    its own threshold from the ROC curve.
+    """
+    predicts_call = score >= threshold
+    expects_call = test["type"] == "function_call"
+    print(f"Softmax of call opener: {score:.4g} -> {'function call' if predicts_call else 'conversation'}")
+    print(f"Time taken: {inference_time:.3f}s")
+    test_passed = predicts_call == expects_call
+    print(f"\n{'✓ TEST PASSED' if test_passed else '✗ TEST FAILED'} - decision at threshold {threshold}")
+
+    result_detail = {
+        "test_name": test["name"],
+        "query": test["query"],
+        "time": inference_time,
+        "probe_softmax": score,
+        "expects_call": expects_call,
+        "passed": test_passed,
+    }
+    if "repeat" in test:
+        result_detail["repeat"] = test["repeat"]
+    return result_detail
+
+
+def score_arguments(test, argument_scores, inference_time):
+    """Score a test from the enum values chosen by log-likelihood for its expected function
+
+    Only parameters listed in expected_arguments are judged; the test passes
+    unless one of them got a different value.
+    """
+    print(f"Function: {test['expected_function']}")
+    expected = test.get("expected_arguments", {})
+    for parameter, scored in argument_scores.items():
+        margin = f"{scored['margin']:.2f}" if scored["margin"] is not None else "n/a"
+        verdict = ""
+        if parameter in expected:
+            scored["expected"] = expected[parameter]
+            verdict = " ✓" if scored["choice"] == expected[parameter] else f" ✗ (expected: {expected[parameter]})"
+        print(f"  {parameter} = {scored['choice']!r} (margin {margin}){verdict}")
+    print(f"Time taken: {inference_time:.3f}s")
+    judged = [scored for scored in argument_scores.values() if "expected" in scored]
+    test_passed = all(scored["choice"] == scored["expected"] for scored in judged)
+    if judged:
+        print(f"\n{'✓ TEST PASSED' if test_passed else '✗ TEST FAILED'} - {len(judged)} expected argument(s) checked")
+    else:
+        print("\nℹ No expected_arguments to check - scores recorded only")
+
+    result_detail = {
+        "test_name": test["name"],
+        "query": test["query"],
+        "time": inference_time,
+        "argument_scores": argument_scores,
+        "passed": test_passed,
+    }
+    if judged:
+        result_detail["arguments_correct"] = test_passed
+    if "repeat" in test:
+        result_detail["repeat"] = test["repeat"]
+    return result_detail
+
+
+# ----------------- Shared Runners ----------------- #
+
+def run_probe(suite, probe, test, prompt_cache=None, tool_retrieval=None):
+    """Score one test case from the softmax score of the function call opener, without generating"""
+    print_test_header(test)
+    
+    prompt_suffix = suite.build_prompt_suffix(test)
+    start = time.time()
+    if tool_retrieval:
+        tokens = tool_retrieval.tokens(tool_retrieval.tools(test["query"]), prompt_suffix)
+    elif prompt_cache:
+        prompt_cache.restore()
+        tokens = prompt_cache.tokens(prompt_suffix)
+    else:
+        tokens = probe.llm.tokenize((suite.prompt_prefix + prompt_suffix).encode("utf-8"), add_bos=True, special=True)
+    score, prefill_tokens = probe(tokens)
+    inference_time = time.time() - start
+    
+    result_detail = score_probe(test, score, inference_time)
+    result_detail["prompt_tokens"] = len(tokens)
+    result_detail["prefill_tokens"] = prefill_tokens
+    return result_detail
+
+
+def run_argument_scoring(suite, scorer, test):
+    """Score one test case's enum arguments by log-likelihood, without generating the call"""
+    print_test_header(test)
+    
+    start = time.time()
+    argument_scores = scorer.score(suite.prompt_prefix + suite.build_prompt_suffix(test), test["expected_function"])
+    inference_time = time.time() - start
+    
+    return score_arguments(test, argument_scores, inference_time)
+
+
+def run_batch(suite, generator, tests, tool_executor):
+    """Run a batch of test cases through the model together and score them
+
+    Batched decoding has no repair continuation: a Gemma 3 tool_code block
+    cut off by MAX_TOKENS is scored as-is.
+    """
+    suffixes = [suite.build_prompt_suffix(test) for test in tests]
+    memory = MemorySampler(generator.ctx.ctx)
+    memory.start()
+    outputs, batch_tokens_per_second = generator.generate(suite.prompt_prefix, suffixes, stop=suite.STOP_SEQUENCES)
+    memory_metrics = memory.stop()
+    print(f"\nDecoded a batch of {len(tests)} tests at {batch_tokens_per_second:.1f} tokens/s (aggregate)")
+    
+    parsed = [suite.parse_output(output["text"]) for output in outputs]
+    # Start every tool call of the batch at once; scoring below picks up the results
+    for _, function_name, arguments in parsed:
+        if function_name:
+            tool_executor.submit(function_name, arguments)
+    
+    result_details = []
+    for test, output, (assistant_content, function_name, arguments) in zip(tests, outputs, parsed):
+        print_test_header(test)
+        
+        inference_time = output["latency"]
+        
+        print(f"Model output: {assistant_content}")
+        print(f"Time taken: {inference_time:.2f}s (first token after {output['time_to_first_token']:.2f}s)")
+        print()
+        
+        result_detail = score_test(test, assistant_content, inference_time, function_name, arguments,
+                                   tool_executor, suite.SCHEMA_INDEX)
+        result_detail["completion_tokens"] = output["completion_tokens"]
+        result_detail["tokens_per_second"] = output["completion_tokens"] / inference_time if inference_time > 0 else 0.0
+        result_detail["truncated"] = output["completion_tokens"] >= suite.MAX_TOKENS
+        result_detail["time_to_first_token"] = output["time_to_first_token"]
+        result_detail["batch_tokens_per_second"] = batch_tokens_per_second
+        # Memory is shared by the whole batch
+        result_detail.update(memory_metrics)
+        result_details.append(result_detail)
+    return result_details
+
+
+def create_batch_runner(suite, n_threads=None, batch_size=8, tool_backend="live"):
+    """Load the suite's model and return a function that runs a list of test cases as one batch"""
+    # The generator decodes in its own context; the model's is only used to tokenize
+    llm = suite.load_model(n_threads, n_ctx=TOKENIZER_N_CTX)
+    generator = BatchedGenerator(llm, batch_size, suite.MAX_TOKENS, n_threads=n_threads, n_ctx=suite.N_CTX)
+    tool_executor = build_executor(suite.AVAILABLE_FUNCTIONS, tool_backend)
+    return functools.partial(run_batch, suite, generator, tool_executor=tool_executor)
+
+
+# ----------------- Summary ----------------- #
+
+def print_summary(details_path, show_details=True):
+    """Print the pass/fail summary and per-test timings, streamed from the result sink file"""
+    summary = summarize(details_path)
+
+    print("\n" + "=" * 80)
+    print("TEST SUMMARY")
+    print("=" * 80)
+    print(f"Total Tests: {summary['total']}")
+    print(f"Passed: {summary['passed']} ✓")
+    print(f"Failed: {summary['failed']} ✗")
+    print(f"Success Rate: {summary['success_rate']:.1f}%")
+    speed_total = speed_count = 0
+    truncated = truncated_speed = 0
+    for detail in iter_results(details_path):
+        if "tokens_per_second" in detail:
+            speed_total += detail["tokens_per_second"]
+            speed_count += 1
+            if detail.get("truncated"):
+                truncated += 1
+                truncated_speed += detail["tokens_per_second"]
+    if speed_count:
+        print(f"Average Generation Speed: {speed_total / speed_count:.1f} tokens/s")
+    if truncated:
+        # Runs cut off at max_tokens decode a full budget, which skews comparisons such as --grammar vs not
+        untruncated = speed_count - truncated
+        speed = (speed_total - truncated_speed) / untruncated if untruncated else 0.0
+        print(f"Truncated at max_tokens: {truncated}/{speed_count} "
+              f"(average speed of the rest: {speed:.1f} tokens/s)")
+    cache_hits = cache_lookups = 0
+    for detail in iter_results(details_path):
+        if "response_cached" in detail:
+            cache_hits += detail["response_cached"]
+            cache_lookups += 1
+    if cache_lookups:
+        print(f"Response Cache Hits: {cache_hits}/{cache_lookups}")
+    print_call_validation(details_path)
+    print_tool_retrieval(details_path)
+    print_router_summary(details_path)
+    print_probe_summary(details_path)
+    print_argument_scoring(details_path)
+    print_speculative_summary(details_path)
+    print_latency_percentiles(details_path)
+    print_memory_summary(details_path)
+    print()
+
+    if show_details:
+        print("\nDetailed Results:")
+        print("-" * 80)
+        for detail in iter_results(details_path):
+            status = "✓ PASS" if detail["passed"] else "✗ FAIL"
+            print(f"{status} | {detail['test_name']} | {detail['time']:.2f}s")
+
+    print("\n" + "=" * 80)
+    print("TEST SUITE COMPLETE")
+    print("=" * 80)
+
+
+def print_call_validation(details_path):
+    """Print how many calls fit the tool schema, by failure kind, and the argument accuracy"""
+    checked = valid = 0
+    failures = collections.Counter()
+    compared = correct = 0
+    for detail in iter_results(details_path):
+        if "call_errors" in detail:
+            checked += 1
+            valid += not detail["call_errors"]
+            failures.update({kind for kind, _ in detail["call_errors"]})
+        if "arguments_correct" in detail:
+            compared += 1
+            correct += detail["arguments_correct"]
+    if checked:
+        breakdown = ", ".join(f"{kind}: {count}" for kind, count in failures.most_common())
+        print(f"Schema-Valid Calls: {valid}/{checked}" + (f" ({breakdown})" if breakdown else ""))
+    if compared:
+        print(f"Argument Accuracy: {correct}/{compared} ({correct / compared * 100:.1f}%)")
+
+
+def print_tool_retrieval(details_path):
+    """Print recall@k of the tool retrieval stage and the prompt prefix tokens it saved"""
+    retrieved = hits = expected = 0
+    prefix_tokens = full_prefix_tokens = 0
+    for detail in iter_results(details_path):
+        if "retrieved_tools" in detail:
+            retrieved += 1
+            prefix_tokens += detail["prefix_tokens"]
+            full_prefix_tokens += detail["full_prefix_tokens"]
+            if "retrieval_hit" in detail:
+                expected += 1
+                hits += detail["retrieval_hit"]
+    if not retrieved:
+        return
+
+    if expected:
+        print(f"Tool Retrieval Recall@k: {hits}/{expected} ({hits / expected * 100:.1f}%)")
+    print(f"Prompt Prefix: {prefix_tokens / retrieved:.0f} tokens vs {full_prefix_tokens / retrieved:.0f} "
+          f"with all tools ({(1 - prefix_tokens / full_prefix_tokens) * 100:.1f}% less prefill)")
+
+
+def print_router_summary(details_path):
+    """Print how often the intent router skipped the model, its precision / recall and the time it saved
+
+    Precision and recall are measured against the model's own decisions
+    (no call = conversation), which are only known for tests the model ran:
+    in a --router-shadow run that is every test.
+    """
+    routed = total = 0
+    would_skip = agreed = model_conversations = 0
+    skip_time = model_time = model_runs = 0.0
+    for detail in iter_results(details_path):
+        if "router_skip" not in detail:
+            continue
+        total += 1
+        if detail["routed"]:
+            routed += 1
+            continue
+        model_runs += 1
+        model_time += detail["time"]
+        model_conversation = "function_called" not in detail
+        model_conversations += model_conversation
+        if detail["router_skip"]:
+            would_skip += 1
+            agreed += model_conversation
+            skip_time += detail["time"]
+    if not total:
+        return
+
+    if routed:
+        mean_time = model_time / model_runs if model_runs else 0.0
+        print(f"Intent Router: skipped the model for {routed}/{total} tests "
+              f"(~{routed * mean_time:.2f}s of generation at the mean model latency)")
+    if would_skip or model_conversations:
+        precision = agreed / would_skip if would_skip else 0.0
+        recall = agreed / model_conversations if model_conversations else 0.0
+        print(f"Intent Router vs Model: precision {precision * 100:.1f}%, recall {recall * 100:.1f}% "
+              f"({would_skip} would skip, {skip_time:.2f}s of {model_time:.2f}s generation)")
+
+
+def print_probe_summary(details_path):
+    """Print the ROC AUC of probe scores and the threshold that best separates calls from conversation"""
+    scores, labels = [], []
+    for detail in iter_results(details_path):
+        if "probe_softmax" in detail:
+            scores.append(detail["probe_softmax"])
+            labels.append(detail["expects_call"])
+    if not scores:
+        return
+    if all(labels) or not any(labels):
+        print("Probe ROC: needs both function-call and conversation tests")
+        return
+
+    fpr, tpr, thresholds = roc_curve(scores, labels)
+    # Youden's J: the point furthest above the chance diagonal
+    best = max(range(1, len(thresholds)), key=lambda i: tpr[i] - fpr[i])
+    positives = sum(labels)
+    negatives = len(labels) - positives
+    accuracy = (tpr[best] * positives + (1 - fpr[best]) * negatives) / len(labels)
+    print(f"Probe ROC AUC: {roc_auc(fpr, tpr):.3f}")
+    print(f"Probe Threshold: {thresholds[best]:.4g} (TPR {tpr[best] * 100:.1f}%, FPR {fpr[best] * 100:.1f}%, "
+          f"accuracy {accuracy * 100:.1f}%)")
+
+
+def print_argument_scoring(details_path):
+    """Print per-parameter accuracy of log-likelihood enum scoring and its mean margin when right and wrong"""
+    correct = collections.Counter()
+    judged = collections.Counter()
+    margins = {True: [], False: []}
+    for detail in iter_results(details_path):
+        for parameter, scored in detail.get("argument_scores", {}).items():
+            if "expected" not in scored:
+                continue
+            right = scored["choice"] == scored["expected"]
+            judged[parameter] += 1
+            correct[parameter] += right
+            if scored["margin"] is not None:
+                margins[right].append(scored["margin"])
+    if not judged:
+        return
+
+    total = sum(judged.values())
+    print(f"Enum Argument Accuracy: {sum(correct.values())}/{total} "
+          f"({sum(correct.values()) / total * 100:.1f}%; "
+          + ", ".join(f"{parameter} {correct[parameter]}/{count}" for parameter, count in judged.items()) + ")")
+    for right, label in ((True, "correct"), (False, "wrong")):
+        if margins[right]:
+            print(f"Mean Margin ({label}): {sum(margins[right]) / len(margins[right]):.2f} nats")
+
+
+def print_speculative_summary(details_path):
+    """Print the draft acceptance rate and the tokens/s of speculative runs against their baselines"""
+    proposed = accepted = 0
+    tokens = baseline_tokens = 0
+    seconds = baseline_seconds = 0.0
+    speedups = []
+    matches = 0
+    for detail in iter_results(details_path):
+        if "speedup" not in detail:
+            continue
+        proposed += detail["draft_tokens"]
+        accepted += detail["accepted_tokens"]
+        tokens += detail["completion_tokens"]
+        seconds += detail["speculative_time"]
+        baseline_tokens += detail["baseline_tokens"]
+        baseline_seconds += detail["baseline_time"]
+        speedups.append(detail["speedup"])
+        matches += detail["baseline_output_matches"]
+    if not speedups:
+        return
+
+    speed = tokens / seconds if seconds > 0 else 0.0
+    baseline_speed = baseline_tokens / baseline_seconds if baseline_seconds > 0 else 0.0
+    print(f"Draft Acceptance: {accepted}/{proposed} tokens ({accepted / proposed * 100 if proposed else 0:.1f}%)")
+    print(f"Speculative Decoding: {speed:.1f} tokens/s vs {baseline_speed:.1f} without the draft "
+          f"({speed / baseline_speed if baseline_speed > 0 else 0:.2f}x overall, "
+          f"{percentiles(speedups, (50,))[50]:.2f}x median per test; "
+          f"{matches}/{len(speedups)} outputs identical)")
+
+
+def print_latency_percentiles(details_path):
+    """Print p50/p95/p99 of each latency field recorded by the tests"""
+    values = {field: [] for field in LATENCY_FIELDS}
+    for detail in iter_results(details_path):
+        for field in LATENCY_FIELDS:
+            if field in detail:
+                values[field].append(detail[field])
+    if not any(values.values()):
+        return
+
+    print(f"\n{'Latency':<36}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for field in LATENCY_FIELDS:
+        stats = percentiles(values[field])
+        if stats is None:
+            continue
+        label = f"{field} ({'tok/s' if field.endswith('tokens_per_second') else 's'})"
+        print(f"{label:<36}" + "".join(f"{stats[q]:>10.2f}" for q in (50, 95, 99)))
+
+
+def print_memory_summary(details_path):
+    """Print peak and steady-state RSS and the largest llama.cpp context state seen"""
+    peaks, afters, states = [], [], []
+    for detail in iter_results(details_path):
+        if "rss_peak_mb" in detail:
+            peaks.append(detail["rss_peak_mb"])
+            afters.append(detail["rss_after_mb"])
+            states.append(detail["state_mb"])
+    if not peaks:
+        return
+
+    print(f"\nPeak RSS: {max(peaks):.0f} MB")
+    print(f"Steady-State RSS (median after each test): {percentiles(afters, (50,))[50]:.0f} MB")
+    print(f"Largest llama.cpp State (KV cache + logits): {max(states):.1f} MB")
+
+
+# ----------------- Entry Point ----------------- #
+
+def chunked(items, size):
+    """Yield lists of up to size items from any iterable"""
+    iterator = iter(items)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def main(suite):
+    """Command-line entry point shared by the test scripts
+
+    suite is a test script module exposing SUITE_TITLE, RESULTS_PATH,
+    MODEL_PATH, N_CTX, N_BATCH, MAX_TOKENS, GENERATION_BUDGET, TEMPERATURE, STOP_SEQUENCES, SEED, test_cases,
+    SCHEMA_INDEX, AVAILABLE_FUNCTIONS, prompt_prefix, build_prompt_suffix(test), parse_output(text) ->
+    (assistant_content, function_name, arguments), load_model(n_threads, n_ctx) and
+    create_runner(n_threads, use_prefix_cache, stream, use_grammar, response_cache_path, tool_backend,
+    pipeline, top_k_tools, router, probe, score_arguments). Suites that support
+    --speculative also expose DRAFT_MODEL_PATH and accept create_runner(..., speculative, draft_tokens).
+    """
+    parser = argparse.ArgumentParser(description=f"{suite.SUITE_TITLE} (function calling)")
+    parser.add_argument("--model", default=None, metavar="PATH",
+                        help=f"GGUF file to evaluate (default: {suite.MODEL_PATH})")
+    parser.add_argument("--n-ctx", type=int, default=None,
+                        help=f"llama.cpp context size (default: {suite.N_CTX})")
+    parser.add_argument("--auto-ctx", action="store_true",
+                        help="size n_ctx to the longest prompt in the test set plus the generation budget")
+    parser.add_argument("--compare-load-time", action="store_true",
+                        help="with --auto-ctx, also time model loads at the original and the sized n_ctx "
+                             "after the run (two extra loads)")
+    parser.add_argument("--n-batch", type=int, default=None,
+                        help=f"llama.cpp prompt batch size (default: {suite.N_BATCH})")
+    parser.add_argument("--results", default=None, metavar="PATH",
+                        help=f"results JSON path (default: {suite.RESULTS_PATH})")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of worker processes, each loading its own model")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="llama.cpp threads per model (default: cores / workers when --workers > 1)")
+    parser.add_argument("--no-prefix-cache", action="store_true",
+                        help="reset the context and prefill the full prompt for every test")
+    parser.add_argument("--stream", action="store_true",
+                        help="stream tokens and stop as soon as the output is clearly a tool call or prose")
+    parser.add_argument("--grammar", action="store_true",
+                        help="constrain output to prose or a well-formed call (GBNF compiled from tools_list)")
+    parser.add_argument("--batch", type=int, default=1,
+                        help="decode this many tests together as parallel sequences in one llama.cpp context")
+    parser.add_argument("--dataset", default=None,
+                        help="stream test cases from a .jsonl or .jsonl.gz file instead of the built-in test_cases")
+    parser.add_argument("--resume", action="store_true",
+                        help="keep the previous run's results and skip tests that already completed with this model, prompt and sampling setup")
+    parser.add_argument("--response-cache", default=None, metavar="PATH",
+                        help="reuse completions from this SQLite file when model, prompt and sampling params match (not used with --stream)")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="warm up, repeat every test and report latency / pass-rate statistics with bootstrap CIs")
+    parser.add_argument("--warmup", type=int, default=1,
+                        help="untimed warmup runs before a benchmark (default: 1)")
+    parser.add_argument("--repeats", type=int, default=5,
+                        help="timed runs per test in a benchmark, each with its own seed (default: 5)")
+    parser.add_argument("--baseline", default=None, metavar="PATH",
+                        help="compare the benchmark against this baseline file and exit 1 on a regression")
+    parser.add_argument("--save-baseline", default=None, metavar="PATH",
+                        help="save the benchmark statistics as a baseline file")
+    parser.add_argument("--regression-threshold", type=float, default=0.10,
+                        help="relative change in mean latency or pass rate that counts as a regression (default: 0.10)")
+    parser.add_argument("--tools", choices=["live", "local"], default="live",
+                        help="run get_weather / get_stock_price against the live APIs or local stand-ins (no network)")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="run each test's tool call in the background while the next test generates")
+    parser.add_argument("--memory-budget", type=float, default=None, metavar="MB",
+                        help="fail the run as soon as a test's peak RSS exceeds this many MB")
+    parser.add_argument("--top-k-tools", type=int, default=None, metavar="K",
+                        help="declare only the K tools that best match each query (BM25 over names, descriptions and enums)")
+    parser.add_argument("--router", default=None, metavar="PATH",
+                        help="skip the model for queries this intent router (trained with intent_router.py) marks as chit-chat")
+    parser.add_argument("--router-threshold", type=float, default=None, metavar="P",
+                        help="conversation probability at which the router skips the model (default: the router's own)")
+    parser.add_argument("--router-shadow", action="store_true",
+                        help="run the model on every test anyway and report the router's precision / recall against it")
+    parser.add_argument("--probe", action="store_true",
+                        help="prefill only and score each test by the probability that the next token opens a function call")
+    parser.add_argument("--score-arguments", action="store_true",
+                        help="pick each enum argument of the expected function by log-likelihood instead of generating the call")
+    parser.add_argument("--speculative", choices=["draft", "lookup"], default=None,
+                        help="speculative decoding with a small draft model or prompt n-gram lookup; "
+                             "each test also runs once without it as a baseline")
+    parser.add_argument("--draft-tokens", type=int, default=8, metavar="N",
+                        help="tokens proposed per speculative step (default: 8)")
+    parser.add_argument("--draft-model", default=None, metavar="PATH",
+                        help="GGUF draft model for --speculative draft (default: the suite's DRAFT_MODEL_PATH)")
+    args = parser.parse_args()
+    if args.batch > 1 and args.workers > 1:
+        parser.error("--batch and --workers cannot be combined")
+    if args.batch > 1 and args.response_cache:
+        parser.error("--batch and --response-cache cannot be combined")
+    if args.batch > 1 and (args.stream or args.grammar or args.no_prefix_cache):
+        parser.error("--batch decodes without streaming, grammars or prefix-cache control; "
+                     "it cannot be combined with --stream, --grammar or --no-prefix-cache")
+    if args.benchmark and (args.workers > 1 or args.response_cache or args.resume):
+        parser.error("--benchmark needs a single model process without --response-cache or --resume")
+    if (args.baseline or args.save_baseline) and not args.benchmark:
+        parser.error("--baseline and --save-baseline require --benchmark")
+    if args.pipeline and (args.batch > 1 or args.workers > 1):
+        parser.error("--pipeline runs in a single process; batched runs already overlap their tool calls")
+    if args.top_k_tools and args.batch > 1:
+        parser.error("--top-k-tools needs a per-query prompt; batched decoding shares one prefix")
+    if args.router and args.batch > 1:
+        parser.error("--router and --batch cannot be combined")
+    if (args.router_threshold is not None or args.router_shadow) and not args.router:
+        parser.error("--router-threshold and --router-shadow require --router")
+    if args.probe and (args.stream or args.grammar or args.batch > 1 or args.response_cache or args.pipeline
+                       or args.router):
+        parser.error("--probe only prefills; it cannot be combined with --stream, --grammar, --batch, "
+                     "--response-cache, --pipeline or --router")
+    if args.score_arguments and (args.stream or args.grammar or args.batch > 1 or args.response_cache
+                                 or args.pipeline or args.router or args.probe or args.top_k_tools):
+        parser.error("--score-arguments scores the full prompt without generating; it cannot be combined with "
+                     "--stream, --grammar, --batch, --response-cache, --pipeline, --router, --probe or --top-k-tools")
+    if args.speculative and not hasattr(suite, "DRAFT_MODEL_PATH"):
+        parser.error(f"--speculative is not supported by the {suite.SUITE_TITLE}")
+    if args.speculative and (args.stream or args.grammar or args.batch > 1 or args.response_cache
+                             or args.probe or args.score_arguments):
+        parser.error("--speculative compares full generations with and without the draft; it cannot be combined "
+                     "with --stream, --grammar, --batch, --response-cache, --probe or --score-arguments")
+    if args.draft_model and args.speculative != "draft":
+        parser.error("--draft-model requires --speculative draft")
+    if args.auto_ctx and args.n_ctx:
+        parser.error("--auto-ctx and --n-ctx cannot be combined")
+    if args.compare_load_time and (not args.auto_ctx or args.batch > 1 or args.workers > 1):
+        parser.error("--compare-load-time requires --auto-ctx in a single process without --batch")
+
+    # Command-line overrides of the suite's module constants, re-applied in every worker
+    overrides = {
+        name: value
+        for name, value in (("MODEL_PATH", args.model), ("N_CTX", args.n_ctx),
+                            ("N_BATCH", args.n_batch), ("RESULTS_PATH", args.results),
+                            ("DRAFT_MODEL_PATH", args.draft_model))
+        if value is not None
+    }
+    for name, value in overrides.items():
+        setattr(suite, name, value)
+
+    results_extra = {}
+    if args.auto_ctx:
+        # A separate lazy pass over the tests, so a dataset is still never held in memory
+        sizing_cases = load_test_cases(args.dataset) if args.dataset else suite.test_cases
+        sizing = size_context(suite.MODEL_PATH, suite.prompt_prefix,
+                              (suite.build_prompt_suffix(test) for test in sizing_cases),
+                              suite.GENERATION_BUDGET)
+        kv_saved = (suite.N_CTX - sizing["n_ctx"]) * sizing["kv_bytes_per_token"] / (1024 * 1024)
+        print(f"Context: n_ctx {suite.N_CTX} -> {sizing['n_ctx']} "
+              f"(longest prompt {sizing['prompt_tokens']} + {suite.GENERATION_BUDGET} generation tokens), "
+              f"~{kv_saved:.0f} MB less KV cache per model\n")
+        # Written to the results JSON next to the pass / fail counts
+        results_extra["context_sizing"] = dict(
+            n_ctx_before=suite.N_CTX,
+            n_ctx_after=sizing["n_ctx"],
+            prompt_tokens=sizing["prompt_tokens"],
+            kv_saved_mb=kv_saved,
+        )
+        overrides["N_CTX"] = suite.N_CTX = sizing["n_ctx"]
+
+    router = IntentRouter.load(args.router, args.router_threshold, args.router_shadow) if args.router else None
+
+    n_threads = args.threads
+    if n_threads is None and args.workers > 1:
+        n_threads = threads_per_worker(args.workers)
+    runner_kwargs = dict(
+        n_threads=n_threads,
+        use_prefix_cache=not args.no_prefix_cache,
+        stream=args.stream,
+        use_grammar=args.grammar,
+        response_cache_path=args.response_cache,
+        tool_backend=args.tools,
+        pipeline=args.pipeline,
+        top_k_tools=args.top_k_tools,
+        router=router,
+        probe=args.probe,
+        score_arguments=args.score_arguments,
+    )
+    if args.speculative:
+        # Only passed when used; suites without a draft model don't take these
+        runner_kwargs.update(speculative=args.speculative, draft_tokens=args.draft_tokens)
+
+    # Every result is appended to the sink file as soon as its test finishes;
+    # the summary and the results JSON are rebuilt from that file at the end
+    details_path = os.path.splitext(suite.RESULTS_PATH)[0] + "_details.jsonl"
+
+    def load_suite_tests():
+        # Datasets can be far larger than memory, so they are read lazily
+        tests = load_test_cases(args.dataset) if args.dataset else suite.test_cases
+        if args.score_arguments:
+            # Only tests whose expected function has enum parameters have anything to score
+            tests = (
+                test for test in tests
+                if suite.SCHEMA_INDEX.functions.get(test["expected_function"], {}).get("enums")
+            )
+        return tests
+
+    # Anything that changes the output is part of the checkpoint key
+    sampling_params = dict(
+        max_tokens=suite.MAX_TOKENS,
+        temperature=suite.TEMPERATURE,
+        stop=suite.STOP_SEQUENCES,
+        seed=suite.SEED,
+        stream=args.stream,
+        grammar=args.grammar,
+        batch=args.batch > 1,
+    )
+    if args.top_k_tools:
+        # Only set when used, so earlier runs' checkpoint keys stay valid
+        sampling_params["top_k_tools"] = args.top_k_tools
+    if router:
+        sampling_params["router"] = router.fingerprint()
+    if args.probe:
+        sampling_params["probe"] = True
+    if args.speculative:
+        sampling_params["speculative"] = [args.speculative, args.draft_tokens]
+    if args.score_arguments:
+        sampling_params["score_arguments"] = True
+    if args.benchmark:
+        test_cases = repeat_tests(load_suite_tests, args.repeats, suite.SEED)
+    else:
+        test_cases = load_suite_tests()
+    checkpoint = Checkpoint(suite, sampling_params, details_path if args.resume else None)
+    test_cases = checkpoint.pending(test_cases)
+
+    print("=" * 80)
+    print(f"STARTING {suite.SUITE_TITLE}")
+    print("=" * 80)
+    print()
+
+    if args.batch > 1:
+        print(f"Decoding {args.batch} sequences per batch\n")
+        load_start = time.time()
+        run_batch = create_batch_runner(suite, n_threads=n_threads, batch_size=args.batch, tool_backend=args.tools)
+        load_time = time.time() - load_start
+        print(f"Model ready in {load_time:.2f}s (n_ctx {suite.N_CTX})\n")
+        if args.auto_ctx:
+            results_extra["context_sizing"]["load_time"] = load_time
+        if args.benchmark:
+            warm_up(run_batch, suite.test_cases[:args.batch], args.warmup)
+        result_details = itertools.chain.from_iterable(
+            run_batch(tests) for tests in chunked(test_cases, args.batch)
+        )
+    elif args.workers > 1:
+        print(f"Running with {args.workers} workers x {n_threads} threads\n")
+        suite_module = os.path.splitext(os.path.basename(suite.__file__))[0]
+        result_details = run_parallel(suite_module, test_cases, args.workers, runner_kwargs, overrides)
+    else:
+        load_start = time.time()
+        run_test = suite.create_runner(**runner_kwargs)
+        load_time = time.time() - load_start
+        print(f"Model ready in {load_time:.2f}s (n_ctx {suite.N_CTX})\n")
+        if args.auto_ctx:
+            results_extra["context_sizing"]["load_time"] = load_time
+        if args.benchmark:
+            # Not the first test, which would then reuse the warmup's whole prompt
+            warm_up(run_test, suite.test_cases[-1], args.warmup)
+        if args.pipeline:
+            result_details = run_pipelined(run_test, test_cases)
+        else:
+            result_details = (run_test(test) for test in test_cases)
+
+    over_budget = None
+    with ResultSink(details_path, mode="a" if args.resume else "w") as sink:
+        for result_detail in result_details:
+            sink.write(checkpoint.tag(result_detail))
+            if args.memory_budget and result_detail.get("rss_peak_mb", 0) > args.memory_budget:
+                over_budget = result_detail
+                break
+
+    if checkpoint.skipped:
+        print(f"\nResumed: skipped {checkpoint.skipped} tests completed in an earlier run")
+
+    if args.compare_load_time:
+        # After the run, so the weights are in the page cache for both loads
+        sizing = results_extra["context_sizing"]
+        load_times = compare_load_times(functools.partial(suite.load_model, n_threads=n_threads),
+                                        sizing["n_ctx_before"], sizing["n_ctx_after"])
+        sizing.update(load_times, load_time_saved=load_times["load_time_before"] - load_times["load_time_after"])
+        print(f"\nLoad time: n_ctx {sizing['n_ctx_before']} {load_times['load_time_before']:.2f}s -> "
+              f"n_ctx {sizing['n_ctx_after']} {load_times['load_time_after']:.2f}s")
+
+    # A dataset run's per-test results stay in the JSONL file only
+    print_summary(details_path, show_details=not args.dataset)
+    export_json(details_path, suite.RESULTS_PATH, include_details=not args.dataset, extra=results_extra)
+    print(f"\nResults saved to: {suite.RESULTS_PATH}")
+    print(f"Per-test results saved to: {details_path}")
+
+    if over_budget:
+        print(f"\n✗ MEMORY BUDGET EXCEEDED - {over_budget['test_name']} peaked at "
+              f"{over_budget['rss_peak_mb']:.0f} MB (budget: {args.memory_budget:.0f} MB)")
+        raise SystemExit(1)
+
+    if args.benchmark:
+        report = summarize_benchmark(details_path)
+        if report is None:
+            # An empty dataset, or every test filtered out (e.g. no enum parameters to score)
+            print("\nBenchmark: no results to report")
+            return
+        baseline = load_baseline(args.baseline) if args.baseline else None
+        regressions = find_regressions(report, baseline, args.regression_threshold) if baseline else []
+        print_benchmark_report(report, baseline, regressions)
+        if args.save_baseline:
+            save_baseline(report, args.save_baseline)
+            print(f"\nBaseline saved to: {args.save_baseline}")
+        if regressions:
+            raise SystemExit(1)
@@ -0,0 +1,146 @@
+import argparse
+import hashlib
+import importlib
+import re
+import time
+import zlib
+
+import numpy as np
+
+from dataset_loader import load_test_cases
+
+
+# ----------------- Intent Router ----------------- #
+
+WORD_PATTERN = re.compile(r"[a-z0-9']+")
+
+
+def hashed_features(text, n_features):
+    """Feature indices and L2-normalized counts for word unigrams, word bigrams and character trigrams
+
+    Features are hashed with crc32, which is stable across processes (unlike
+    hash()). Every text also gets a constant feature, which acts as the bias.
+    """
+    words = WORD_PATTERN.findall(text.lower())
+    grams = ["<bias>"]
+    grams += words
+    grams += [f"{a} {b}" for a, b in zip(words, words[1:])]
+    for word in words:
+        padded = f"#{word}#"
+        grams += [padded[i:i + 3] for i in range(len(padded) - 2)]
+    indices, counts = np.unique(
+        np.fromiter((zlib.crc32(gram.encode("utf-8")) % n_features for gram in grams), dtype=np.int64, count=len(grams)),
+        return_counts=True,
+    )
+    values = counts.astype(np.float32)
+    return indices, values / np.linalg.norm(values)
+
+
+class IntentRouter:
+    """Logistic regression on hashed n-grams that predicts whether a query is chit-chat
+
+    route() sends queries whose conversation probability reaches threshold
+    straight to a "conversation" verdict, without a model call. With shadow
+    set the model still runs, so the router's choices can be compared with
+    the model's.
+    """
+
+    def __init__(self, weights, threshold=0.9, shadow=False):
+        self.weights = weights
+        self.threshold = threshold
+        self.shadow = shadow
+
+    @classmethod
+    def train(cls, test_cases, n_features=2 ** 14, epochs=300, learning_rate=1.0, l2=1e-4, **kwargs):
+        """Fit on labelled test cases (type "conversation" is the positive class) with full-batch gradient descent
+
+        Rows are kept sparse (concatenated indices and values), so training
+        memory grows with the number of n-grams, not n_features per example.
+        """
+        rows = [(hashed_features(test["query"], n_features), test["type"] == "conversation") for test in test_cases]
+        if not rows:
+            raise ValueError("no labelled test cases to train the intent router on")
+        indices = np.concatenate([features[0] for features, _ in rows])
+        values = np.concatenate([features[1] for features, _ in rows])
+        lengths = np.array([len(features[0]) for features, _ in rows])
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        labels = np.array([label for _, label in rows], dtype=np.float32)
+
+        weights = np.zeros(n_features, dtype=np.float32)
+        for _ in range(epochs):
+            logits = np.add.reduceat(weights[indices] * values, offsets)
+            errors = 1 / (1 + np.exp(-logits)) - labels
+            gradient = np.bincount(indices, weights=values * np.repeat(errors, lengths), minlength=n_features)
+            weights -= learning_rate * (gradient / len(rows) + l2 * weights)
+        return cls(weights, **kwargs)
+
+    def save(self, path):
+        np.savez(path, weights=self.weights, threshold=self.threshold)
+
+    @classmethod
+    def load(cls, path, threshold=None, shadow=False):
+        """Load a router saved by save(); threshold overrides the saved one"""
+        with np.load(path) as saved:
+            return cls(saved["weights"], float(saved["threshold"]) if threshold is None else threshold, shadow)
+
+    def fingerprint(self):
+        """Identifies the weights and settings, for checkpoint keys"""
+        digest = hashlib.sha256(self.weights.tobytes()).hexdigest()
+        return [digest, self.threshold, self.shadow]
+
+    def conversation_probability(self, query):
+        indices, values = hashed_features(query, len(self.weights))
+        return float(1 / (1 + np.exp(-(self.weights[indices] @ values))))
+
+    def route(self, test):
+        """Router fields for a test's result record; routed is True when the model should be skipped"""
+        start = time.time()
+        probability = self.conversation_probability(test["query"])
+        skip = probability >= self.threshold
+        return {
+            "router_confidence": probability,
+            "router_skip": skip,
+            "routed": skip and not self.shadow,
+            "router_time": time.time() - start,
+        }
+
+
+def load_training_cases(source):
+    """Labelled test cases from a .jsonl / .jsonl.gz file or a suite module's test_cases"""
+    if source.endswith((".jsonl", ".jsonl.gz")):
+        return list(load_test_cases(source))
+    return importlib.import_module(source).test_cases
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train an intent router on labelled test cases")
+    parser.add_argument("sources", nargs="+",
+                        help=".jsonl / .jsonl.gz files or suite modules (e.g. test_functiongemma_270m)")
+    parser.add_argument("--out", default="intent_router.npz", help="where to save the router (default: %(default)s)")
+    parser.add_argument("--threshold", type=float, default=0.9,
+                        help="conversation probability at which the model is skipped (default: %(default)s)")
+    parser.add_argument("--folds", type=int, default=5, help="cross-validation folds (default: %(default)s)")
+    args = parser.parse_args()
+
+    cases = [test for source in args.sources for test in load_training_cases(source)]
+    conversations = sum(test["type"] == "conversation" for test in cases)
+    print(f"Training on {len(cases)} queries ({conversations} conversation)")
+
+    # Cross-validated precision / recall of the skip decision at the threshold
+    folds = min(args.folds, len(cases))
+    skipped = correct_skips = 0
+    for fold in range(folds):
+        held_out = cases[fold::folds]
+        router = IntentRouter.train([test for i, test in enumerate(cases) if i % folds != fold],
+                                    threshold=args.threshold)
+        for test in held_out:
+            if router.route(test)["router_skip"]:
+                skipped += 1
+                correct_skips += test["type"] == "conversation"
+    precision = correct_skips / skipped if skipped else 0.0
+    recall = correct_skips / conversations if conversations else 0.0
+    print(f"{folds}-fold cross-validation at threshold {args.threshold}: "
+          f"precision {precision:.1%}, recall {recall:.1%} ({skipped} skipped)")
+
+    IntentRouter.train(cases, threshold=args.threshold).save(args.out)
+    print(f"Router saved to: {args.out}")
@@ -0,0 +1,66 @@
+import os
+import resource
+import sys
+import threading
+
+import llama_cpp
+
+
+# ----------------- Memory Tracking ----------------- #
+
+MB = 1024 * 1024
+
+
+def current_rss():
+    """Resident set size of this process in bytes
+
+    Reads /proc on Linux. Elsewhere this falls back to the peak RSS so far,
+    which is the closest figure the standard library offers.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class MemorySampler:
+    """Sample process RSS on a background thread while one generation runs
+
+    llama.cpp releases the GIL during decode, so the sampler sees the RSS
+    while the model is working, not just before and after. After the call
+    the context's state size is recorded: the KV cache in use, which respects
+    per-layer head sizes and sliding-window layers, plus the logits buffer.
+    With logits_all (--speculative) that buffer covers every prompt position,
+    so the figure is not a KV cache size.
+    """
+
+    def __init__(self, ctx, interval=0.005):
+        self.ctx = ctx
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, current_rss())
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self.peak = current_rss()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Return the per-test memory fields for the result record"""
+        self._stop.set()
+        self._thread.join()
+        rss = current_rss()
+        return {
+            "rss_peak_mb": max(self.peak, rss) / MB,
+            "rss_after_mb": rss / MB,
+            "state_mb": llama_cpp.llama_state_get_size(self.ctx) / MB,
+        }
@@ -0,0 +1,83 @@
+import time
+
+import numpy as np
+import llama_cpp
+
+
+# ----------------- Token-Level Latency ----------------- #
+
+# Per-test fields written by TokenTimer, in the order the summary prints them
+LATENCY_FIELDS = [
+    "time",
+    "time_to_first_token",
+    "prefill_tokens_per_second",
+    "decode_tokens_per_second",
+]
+
+
+class TokenTimer:
+    """Split one generation's wall time into prefill and decode using llama.cpp's perf counters
+
+    llama.cpp counts multi-token decodes (the prompt) as prompt eval and
+    single-token decodes as generation. Time to first token is everything
+    except the generation decodes: tokenization, prefill and the first sample.
+    Prefilled tokens can be fewer than the prompt tokens when the prefix cache
+    already holds the shared prefix.
+    """
+
+    def __init__(self, llm):
+        self.llm = llm
+        self.start_time = None
+
+    def start(self):
+        llama_cpp.llama_perf_context_reset(self.llm._ctx.ctx)
+        self.start_time = time.time()
+
+    def stop(self, completion_tokens):
+        """Return the per-test token and latency fields for the result record"""
+        elapsed = time.time() - self.start_time
+        perf = llama_cpp.llama_perf_context(self.llm._ctx.ctx)
+        prefill_time = perf.t_p_eval_ms / 1000
+        decode_time = perf.t_eval_ms / 1000
+        return {
+            # The context holds the whole prompt plus every token decoded after it
+            "prompt_tokens": self.llm.n_tokens - perf.n_eval,
+            "prefill_tokens": perf.n_p_eval,
+            "completion_tokens": completion_tokens,
+            "time_to_first_token": max(0.0, elapsed - decode_time),
+            "prefill_tokens_per_second": perf.n_p_eval / prefill_time if prefill_time > 0 else 0.0,
+            "decode_tokens_per_second": perf.n_eval / decode_time if decode_time > 0 else 0.0,
+        }
+
+
+def percentiles(values, qs=(50, 95, 99)):
+    """Percentiles of a list of numbers, or None for an empty list"""
+    if not values:
+        return None
+    return dict(zip(qs, np.percentile(values, qs)))
+
+
+# ----------------- Decision Scores ----------------- #
+
+def roc_curve(scores, labels):
+    """False / true positive rates and thresholds for every distinct score, highest first
+
+    Point i counts scores >= thresholds[i] as positive; the curve starts at
+    (0, 0) with an infinite threshold.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    labels = np.asarray(labels, dtype=bool)
+    order = np.argsort(-scores, kind="stable")
+    scores, labels = scores[order], labels[order]
+    # Last index of each run of equal scores
+    ends = np.append(np.flatnonzero(np.diff(scores)), len(scores) - 1)
+    true_positives = np.cumsum(labels)[ends]
+    false_positives = ends + 1 - true_positives
+    fpr = np.concatenate(([0.0], false_positives / max(len(labels) - labels.sum(), 1)))
+    tpr = np.concatenate(([0.0], true_positives / max(labels.sum(), 1)))
+    return fpr, tpr, np.concatenate(([np.inf], scores[ends]))
+
+
+def roc_auc(fpr, tpr):
+    """Area under a ROC curve (trapezoidal, so tied scores count half)"""
+    return float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2))
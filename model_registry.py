@@ -0,0 +1,54 @@
+import collections
+import os
+
+from llama_cpp import Llama
+
+
+# ----------------- Model Registry ----------------- #
+
+class ModelRegistry:
+    """Small LRU pool of loaded models, keyed by model path and load parameters
+
+    A model is only loaded the first time it is asked for. Later requests for
+    the same path and parameters get the warm instance back. Once more than
+    capacity models are loaded, the least recently used one is closed, so
+    runners built on it must not be used afterwards. A parameter object with
+    a registry_key (a draft model) is keyed on that, not on its identity.
+    """
+
+    def __init__(self, capacity=2):
+        self.capacity = capacity
+        self._models = collections.OrderedDict()
+
+    @staticmethod
+    def _key(model_path, params):
+        return os.path.abspath(model_path), tuple(sorted(
+            (name, getattr(value, "registry_key", value)) for name, value in params.items()
+        ))
+
+    def is_loaded(self, model_path, **params):
+        return self._key(model_path, params) in self._models
+
+    def get(self, model_path, **params):
+        """Return a loaded Llama for model_path and params, loading it on first use"""
+        key = self._key(model_path, params)
+        if key in self._models:
+            self._models.move_to_end(key)
+            return self._models[key]
+
+        llm = Llama(model_path=model_path, **params)
+        self._models[key] = llm
+        while len(self._models) > self.capacity:
+            _, evicted = self._models.popitem(last=False)
+            evicted.close()
+        return llm
+
+    def clear(self):
+        """Close every loaded model"""
+        while self._models:
+            _, llm = self._models.popitem(last=False)
+            llm.close()
+
+
+# One pool per process; parallel workers each get their own
+registry = ModelRegistry(capacity=int(os.environ.get("MODEL_POOL_SIZE", 2)))
@@ -0,0 +1,44 @@
+import importlib
+import itertools
+import multiprocessing
+import os
+
+
+# ----------------- Parallel Runner ----------------- #
+
+# Per-process test runner, created by _init_worker in each worker
+_run_test = None
+
+
+def _init_worker(suite_module, runner_kwargs, overrides):
+    """Load this worker's own model via the suite's create_runner()"""
+    global _run_test
+    suite = importlib.import_module(suite_module)
+    for name, value in overrides.items():
+        setattr(suite, name, value)
+    _run_test = suite.create_runner(**runner_kwargs)
+
+
+def _run_one(test):
+    return _run_test(test)
+
+
+def threads_per_worker(workers):
+    """Split the machine's cores evenly across workers"""
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+def run_parallel(suite_module, test_cases, workers, runner_kwargs=None, overrides=None, chunksize=1, window=64):
+    """Shard test_cases across worker processes and yield result details in test order
+
+    suite_module is the importable name of a test script that defines
+    create_runner(**runner_kwargs) -> run_test(test); overrides maps module
+    constants (e.g. MODEL_PATH) to the values set by the parent. test_cases may be a
+    generator: it is submitted window tests per worker at a time, because
+    Pool.imap would otherwise queue the entire input up front.
+    """
+    initargs = (suite_module, runner_kwargs or {}, overrides or {})
+    iterator = iter(test_cases)
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=initargs) as pool:
+        while tests := list(itertools.islice(iterator, workers * window)):
+            yield from pool.imap(_run_one, tests, chunksize)
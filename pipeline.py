@@ -0,0 +1,28 @@
+import contextlib
+import io
+
+
+# ----------------- Pipelined Runner ----------------- #
+
+def run_pipelined(run_test, test_cases):
+    """Overlap each test's tool call with the next test's generation, yielding results in test order
+
+    run_test(test) must generate, start the test's tool call in the background
+    and return a finish() callable that scores the test (a suite runner made
+    with create_runner(pipeline=True)). Each test's output is held back until
+    it is scored, so the log reads the same as a serial run.
+    """
+    pending = None
+    for test in test_cases:
+        with contextlib.redirect_stdout(io.StringIO()) as log:
+            finish = run_test(test)
+        if pending:
+            yield _finish(*pending)
+        pending = (log.getvalue(), finish)
+    if pending:
+        yield _finish(*pending)
+
+
+def _finish(log, finish):
+    print(log, end="")
+    return finish()
@@ -0,0 +1,49 @@
+from llama_cpp import Llama
+
+
+# ----------------- Prefix (KV) Cache ----------------- #
+
+def cold_complete(llm: Llama, prompt, **kwargs):
+    """Complete prompt from an empty context, prefilling every token
+
+    Llama.generate() on its own would reuse the longest prefix shared with
+    the previous prompt, which is most of it when tests share a system prompt.
+    """
+    llm.reset()
+    return llm(prompt, **kwargs)
+
+
+class PrefixCache:
+    """Prefill a shared prompt prefix once and reuse its llama.cpp state"""
+
+    def __init__(self, llm: Llama, prefix):
+        self.llm = llm
+        self.prefix = prefix
+
+        # Tokenize the prefix on its own so every prompt shares the exact same
+        # prefix token ids (tokenizing prefix + query together can merge tokens
+        # across the boundary and break the prefix match).
+        self.prefix_tokens = llm.tokenize(prefix.encode("utf-8"), add_bos=True, special=True)
+
+        llm.reset()
+        llm.eval(self.prefix_tokens)
+        self.state = llm.save_state()
+
+    def tokens(self, suffix):
+        """Token ids for prefix + suffix"""
+        suffix_tokens = self.llm.tokenize(suffix.encode("utf-8"), add_bos=False, special=True)
+        return self.prefix_tokens + suffix_tokens
+
+    def restore(self):
+        """Make sure the context holds the prefix, reloading the snapshot only if needed"""
+        n_prefix = len(self.prefix_tokens)
+        if self.llm.n_tokens >= n_prefix and self.llm.input_ids[:n_prefix].tolist() == self.prefix_tokens:
+            return
+        self.llm.load_state(self.state)
+
+    def __call__(self, suffix, **kwargs):
+        """Complete prefix + suffix, prefilling only the suffix"""
+        self.restore()
+        # Llama.generate() reuses the longest matching prefix of the previous
+        # input ids, so only the suffix tokens are evaluated.
+        return self.llm(self.tokens(suffix), **kwargs)
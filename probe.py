@@ -0,0 +1,44 @@
+import numpy as np
+from llama_cpp import Llama
+
+
+# ----------------- Next-Token Probe ----------------- #
+
+def prefill(llm, tokens):
+    """Evaluate tokens, reusing the longest prefix already in the context; returns the tokens evaluated
+
+    Mirrors Llama.generate(): at least the last token is always evaluated,
+    so its logits are fresh.
+    """
+    reuse = min(Llama.longest_token_prefix(llm.input_ids[:llm.n_tokens].tolist(), tokens), len(tokens) - 1)
+    if reuse > 0 and not llm._ctx.kv_cache_seq_rm(-1, reuse, -1):
+        reuse = 0
+    llm.n_tokens = reuse
+    llm.eval(tokens[reuse:])
+    return len(tokens) - reuse
+
+
+class TokenProbe:
+    """Softmax score that the model's first generated token is the one that opens a function call
+
+    One prefill and a softmax over the last position's logits, with no
+    sampling, so a decision costs a fraction of a full generation. The score
+    is the raw next-token probability, not a calibrated probability of a
+    call, so compare scores by rank (ROC) rather than against 0.5. Only the
+    first token of marker is scored.
+    """
+
+    def __init__(self, llm, marker):
+        self.llm = llm
+        self.marker = marker
+        self.marker_token = llm.tokenize(marker.encode("utf-8"), add_bos=False, special=True)[0]
+        self.n_vocab = llm.n_vocab()
+
+    def __call__(self, tokens):
+        """Return (marker softmax score, tokens prefilled) for a prompt's token ids"""
+        prefill_tokens = prefill(self.llm, tokens)
+        logits = np.ctypeslib.as_array(self.llm._ctx.get_logits_ith(-1), shape=(self.n_vocab,)).astype(np.float64)
+        # Log-sum-exp, so large logits cannot overflow
+        peak = logits.max()
+        log_prob = logits[self.marker_token] - peak - np.log(np.exp(logits - peak).sum())
+        return float(np.exp(log_prob)), prefill_tokens
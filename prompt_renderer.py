@@ -0,0 +1,67 @@
+import collections
+import hashlib
+import json
+
+
+# ----------------- Cached Tool Prompt Rendering ----------------- #
+
+class ToolPromptRenderer:
+    """Render tool declarations one tool at a time, caching each fragment by schema hash
+
+    A prompt for any subset of tools is assembled by joining cached fragments,
+    so a tool is only rendered the first time it is seen. Whole prompts and their
+    token ids are also cached per tool subset (LRU, max_subsets entries).
+    Token ids are cached for the whole prompt rather than stitched together
+    from per-fragment token ids, because the tokenizer can merge across
+    fragment boundaries.
+
+    Tool schema dicts are treated as immutable: a tool's hash is remembered
+    for as long as the renderer holds it.
+    """
+
+    def __init__(self, render_tool, wrap, separator="", max_subsets=1024):
+        self.render_tool = render_tool
+        self.wrap = wrap
+        self.separator = separator
+        self.max_subsets = max_subsets
+        self._hashes = {}
+        self._fragments = {}
+        self._prompts = collections.OrderedDict()
+        self._tokens = collections.OrderedDict()
+
+    def schema_hash(self, tool):
+        entry = self._hashes.get(id(tool))
+        if entry is None or entry[0] is not tool:
+            digest = hashlib.sha256(json.dumps(tool, sort_keys=True).encode("utf-8")).hexdigest()
+            entry = self._hashes[id(tool)] = (tool, digest)
+        return entry[1]
+
+    def fragment(self, tool):
+        """The rendered declaration for one tool"""
+        key = self.schema_hash(tool)
+        if key not in self._fragments:
+            self._fragments[key] = self.render_tool(tool)
+        return self._fragments[key]
+
+    def declarations(self, tools):
+        """All declarations for tools, joined in order"""
+        return self.separator.join(self.fragment(tool) for tool in tools)
+
+    def _cached(self, cache, key, build):
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+        value = cache[key] = build()
+        if len(cache) > self.max_subsets:
+            cache.popitem(last=False)
+        return value
+
+    def prompt(self, tools):
+        """The full prompt (declarations wrapped by wrap()) for a tool subset"""
+        key = tuple(self.schema_hash(tool) for tool in tools)
+        return self._cached(self._prompts, key, lambda: self.wrap(self.declarations(tools)))
+
+    def tokens(self, tools, tokenize):
+        """Token ids of prompt(tools), tokenized only the first time this subset is seen"""
+        key = tuple(self.schema_hash(tool) for tool in tools)
+        return self._cached(self._tokens, key, lambda: tokenize(self.prompt(tools)))
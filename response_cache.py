@@ -0,0 +1,135 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+
+# ----------------- Persistent Response Cache ----------------- #
+
+def _sha256(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """On-disk cache of completions, keyed by (model file hash, prompt, sampling params)
+
+    Re-running a suite after changing only the scoring logic then skips the
+    model entirely: a hit returns the cached text and token count together with
+    the timing of the run that generated it. Entries are evicted least recently used
+    first once the cached text exceeds max_bytes. SQLite handles locking, so
+    parallel workers can share one cache file.
+    """
+
+    def __init__(self, path, model_path, max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.db = sqlite3.connect(path, timeout=60)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, text TEXT, completion_tokens INTEGER, "
+            "time REAL, size INTEGER, last_used REAL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS model_hashes ("
+            "path TEXT PRIMARY KEY, size INTEGER, mtime REAL, sha256 TEXT)"
+        )
+        self.db.commit()
+        self.model_hash = self._model_hash(model_path)
+
+    def _model_hash(self, model_path):
+        """sha256 of the GGUF file, only recomputed when its size or mtime changes"""
+        path = os.path.abspath(model_path)
+        stat = os.stat(path)
+        row = self.db.execute("SELECT size, mtime, sha256 FROM model_hashes WHERE path = ?", (path,)).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime:
+            return row[2]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            while block := f.read(1 << 24):
+                digest.update(block)
+        sha256 = digest.hexdigest()
+        self.db.execute(
+            "INSERT OR REPLACE INTO model_hashes VALUES (?, ?, ?, ?)",
+            (path, stat.st_size, stat.st_mtime, sha256),
+        )
+        self.db.commit()
+        return sha256
+
+    def key(self, prompt, params):
+        """Cache key for one completion call"""
+        params = dict(params)
+        if params.get("grammar") is not None:
+            # LlamaGrammar keeps its GBNF source; the object itself has no stable identity
+            params["grammar"] = _sha256(params["grammar"]._grammar)
+        return _sha256(json.dumps([self.model_hash, prompt, params], sort_keys=True))
+
+    def get(self, prompt, params):
+        """Return the cached {text, completion_tokens, time} for a call, or None"""
+        key = self.key(prompt, params)
+        row = self.db.execute("SELECT text, completion_tokens, time FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        self.db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+        self.db.commit()
+        return {"text": row[0], "completion_tokens": row[1], "time": row[2]}
+
+    def put(self, prompt, params, text, completion_tokens, elapsed):
+        """Store one completion, then evict the least recently used entries over max_bytes"""
+        size = len(text.encode("utf-8"))
+        self.db.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+            (self.key(prompt, params), text, completion_tokens, elapsed, size, time.time()),
+        )
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total > self.max_bytes:
+            for key, size in self.db.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall():
+                self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                total -= size
+                if total <= self.max_bytes:
+                    break
+        self.db.commit()
+
+    def __call__(self, complete, prompt, **params):
+        """Run complete(**params) for prompt through the cache
+
+        Returns the completion response and the generation time, which for a
+        hit is the time recorded when the response was first generated.
+        """
+        cached = self.get(prompt, params)
+        if cached:
+            response = {
+                "choices": [{"text": cached["text"]}],
+                "usage": {"completion_tokens": cached["completion_tokens"]},
+                "cached": True,
+            }
+            return response, cached["time"]
+
+        start = time.time()
+        response = complete(**params)
+        elapsed = time.time() - start
+        self.put(prompt, params, response["choices"][0]["text"], response["usage"]["completion_tokens"], elapsed)
+        return response, elapsed
+
+    def close(self):
+        self.db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or clear a response cache file")
+    parser.add_argument("path")
+    parser.add_argument("--clear", action="store_true", help="delete every cached response")
+    args = parser.parse_args()
+
+    db = sqlite3.connect(args.path)
+    if args.clear:
+        db.execute("DELETE FROM responses")
+        db.commit()
+        db.execute("VACUUM")
+    entries, total = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+    print(f"Cached responses: {entries}")
+    print(f"Cached text: {total / 1024:.1f} KiB")
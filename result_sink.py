@@ -0,0 +1,133 @@
+import argparse
+import json
+import time
+
+
+# ----------------- Append-Only Result Sink ----------------- #
+
+class ResultSink:
+    """Append one JSON line per finished test, flushing every few results or seconds
+
+    Nothing is kept in memory, and a crashed run leaves every flushed result
+    on disk, readable with iter_results() / summarize().
+    """
+
+    def __init__(self, path, mode="w", flush_every=10, flush_interval=5.0):
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        if mode == "a":
+            drop_partial_line(path)
+        self._file = open(path, mode, encoding="utf-8")
+        self._pending = 0
+        self._last_flush = time.time()
+
+    def write(self, result_detail):
+        """Append one test's result detail"""
+        self._file.write(json.dumps(result_detail) + "\n")
+        self._pending += 1
+        if self._pending >= self.flush_every or time.time() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self._file.flush()
+        self._pending = 0
+        self._last_flush = time.time()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def drop_partial_line(path):
+    """Truncate a sink file after its last newline, so appends don't merge into a line cut short by a crash"""
+    try:
+        with open(path, "rb+") as f:
+            size = f.seek(0, 2)
+            if size == 0:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b"\n":
+                return
+            # Scan back from the end in blocks; sink files can be larger than memory
+            end = size
+            while end > 0:
+                start = max(0, end - 65536)
+                f.seek(start)
+                newline = f.read(end - start).rfind(b"\n")
+                if newline != -1:
+                    f.truncate(start + newline + 1)
+                    return
+                end = start
+            f.truncate(0)
+    except FileNotFoundError:
+        pass
+
+
+# ----------------- Reading Results Back ----------------- #
+
+def iter_results(path):
+    """Stream result details back from a sink file
+
+    A line cut short by a crash mid-write is skipped.
+    """
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def summarize(path):
+    """Rebuild the pass/fail summary by streaming over a sink file"""
+    summary = {"passed": 0, "failed": 0, "total": 0}
+    for detail in iter_results(path):
+        summary["total"] += 1
+        if detail["passed"]:
+            summary["passed"] += 1
+        else:
+            summary["failed"] += 1
+    summary["success_rate"] = summary["passed"] / summary["total"] * 100 if summary["total"] else 0.0
+    return summary
+
+
+def export_json(path, json_path, include_details=True, extra=None):
+    """Write the classic {passed, failed, total, details} results JSON from a sink file
+
+    Details are copied one at a time, so memory stays flat however long the run was.
+    extra holds further top-level fields, written before details.
+    """
+    summary = summarize(path)
+    with open(json_path, "w", encoding="utf-8") as f:
+        f.write("{\n")
+        for key in ("passed", "failed", "total"):
+            f.write(f'  "{key}": {summary[key]},\n')
+        for key, value in (extra or {}).items():
+            f.write(f'  {json.dumps(key)}: {json.dumps(value)},\n')
+        f.write('  "details": [')
+        if include_details:
+            for i, detail in enumerate(iter_results(path)):
+                f.write(",\n" if i else "\n")
+                f.write("    " + json.dumps(detail))
+            if summary["total"]:
+                f.write("\n  ")
+        f.write("]\n}\n")
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize a (possibly partial) results JSONL file")
+    parser.add_argument("path")
+    args = parser.parse_args()
+
+    summary = summarize(args.path)
+    print(f"Total Tests: {summary['total']}")
+    print(f"Passed: {summary['passed']} ✓")
+    print(f"Failed: {summary['failed']} ✗")
+    print(f"Success Rate: {summary['success_rate']:.1f}%")
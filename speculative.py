@@ -0,0 +1,128 @@
+import os
+import time
+
+import numpy as np
+from llama_cpp import Llama
+from llama_cpp.llama_speculative import LlamaDraftModel, LlamaPromptLookupDecoding
+
+from probe import prefill
+
+
+# ----------------- Speculative Decoding ----------------- #
+
+class SmallModelDraft(LlamaDraftModel):
+    """Greedy proposals from a smaller model that shares the target's vocabulary
+
+    The draft context keeps the longest prefix it has in common with each new
+    input, so only the tokens accepted since the last proposal are evaluated.
+    """
+
+    def __init__(self, llm: Llama, num_pred_tokens=8):
+        self.llm = llm
+        self.num_pred_tokens = num_pred_tokens
+        self.n_vocab = llm.n_vocab()
+        self.eog_tokens = {llm.token_eos()}
+        end_of_turn = llm.tokenize(b"<end_of_turn>", add_bos=False, special=True)
+        if len(end_of_turn) == 1:
+            self.eog_tokens.add(end_of_turn[0])
+
+    def __call__(self, input_ids, /, **kwargs):
+        prefill(self.llm, input_ids.tolist())
+        draft = []
+        while True:
+            logits = np.ctypeslib.as_array(self.llm._ctx.get_logits_ith(-1), shape=(self.n_vocab,))
+            token = int(np.argmax(logits))
+            if token in self.eog_tokens:
+                break
+            draft.append(token)
+            if len(draft) == self.num_pred_tokens:
+                break
+            self.llm.eval([token])
+        return np.array(draft, dtype=np.intc)
+
+
+class MeasuredDraft(LlamaDraftModel):
+    """Wrap a draft model to count how many of its proposed tokens the target accepts
+
+    Llama.generate() calls the draft model with every token verified so far,
+    so each proposal is checked against the tokens that follow its start
+    position on the next call. A proposal still pending when generation stops
+    is not counted. registry_key describes the draft's configuration; the
+    model registry keys on it instead of on the instance.
+    """
+
+    def __init__(self, draft: LlamaDraftModel, registry_key=None):
+        self.draft = draft
+        self.registry_key = registry_key
+        self.reset()
+
+    def reset(self):
+        self.proposed = 0
+        self.accepted = 0
+        self.draft_time = 0.0
+        self._pending = None
+
+    def __call__(self, input_ids, /, **kwargs):
+        if self._pending:
+            start, proposal = self._pending
+            self.proposed += len(proposal)
+            self.accepted += Llama.longest_token_prefix(proposal, input_ids[start:].tolist())
+        draft_start = time.time()
+        proposal = self.draft(input_ids, **kwargs)
+        self.draft_time += time.time() - draft_start
+        self._pending = (len(input_ids), proposal.tolist())
+        return proposal
+
+    def stats(self):
+        """Per-test draft fields for the result record"""
+        return {
+            "draft_tokens": self.proposed,
+            "accepted_tokens": self.accepted,
+            "acceptance_rate": self.accepted / self.proposed if self.proposed else 0.0,
+            "draft_time": self.draft_time,
+        }
+
+
+def build_draft(kind, draft_llm=None, num_pred_tokens=8):
+    """MeasuredDraft over a small draft model ("draft") or prompt n-gram lookup ("lookup")"""
+    if kind == "draft":
+        registry_key = (kind, os.path.abspath(draft_llm.model_path), num_pred_tokens)
+        return MeasuredDraft(SmallModelDraft(draft_llm, num_pred_tokens), registry_key)
+    return MeasuredDraft(LlamaPromptLookupDecoding(num_pred_tokens=num_pred_tokens), (kind, None, num_pred_tokens))
+
+
+def run_without_draft(llm, complete, **params):
+    """Run complete() with the draft model switched off, for a per-test baseline
+
+    Afterwards the context is rewound to the prefix it shared with the state
+    before the call, so the speculative run that follows prefills exactly as
+    many tokens as the baseline did. Returns (response, seconds).
+    """
+    before = llm.input_ids[:llm.n_tokens].tolist()
+    draft, llm.draft_model = llm.draft_model, None
+    start = time.time()
+    try:
+        response = complete(**params)
+    finally:
+        llm.draft_model = draft
+    elapsed = time.time() - start
+    llm.n_tokens = Llama.longest_token_prefix(before, llm.input_ids[:llm.n_tokens].tolist())
+    return response, elapsed
+
+
+def speculative_fields(draft, baseline_response, baseline_time, text, completion_tokens, elapsed):
+    """Acceptance and speedup fields comparing a speculative generation with its baseline"""
+    baseline_tokens = baseline_response["usage"]["completion_tokens"]
+    baseline_speed = baseline_tokens / baseline_time if baseline_time > 0 else 0.0
+    speed = completion_tokens / elapsed if elapsed > 0 else 0.0
+    fields = draft.stats()
+    fields.update({
+        "baseline_time": baseline_time,
+        "baseline_tokens": baseline_tokens,
+        "baseline_tokens_per_second": baseline_speed,
+        "speculative_time": elapsed,
+        "speculative_tokens_per_second": speed,
+        "speedup": speed / baseline_speed if baseline_speed > 0 else 0.0,
+        "baseline_output_matches": baseline_response["choices"][0]["text"].strip() == text,
+    })
+    return fields
@@ -0,0 +1,67 @@
+# ----------------- Streaming Early Exit ----------------- #
+
+class StreamClassifier:
+    """Decide from partial output whether the model is calling a tool or chatting
+
+    Chunks are passed straight to an incremental call parser (see
+    call_parser.py). The output commits to a tool call as soon as the parser
+    sees the call opener and is finished once the call closes. It commits to
+    prose once it has at least prose_chars non-whitespace characters and its
+    tail cannot be the start of the opener.
+    """
+
+    def __init__(self, parser, prose_chars=1):
+        self.parser = parser
+        self.prose_chars = prose_chars
+        self.verdict = None  # "function_call" or "conversation" once decided
+        self._chars = 0
+
+    def feed(self, chunk):
+        """Consume the next chunk of output; returns True once generation can stop"""
+        self.parser.feed(chunk)
+
+        if self.verdict is None:
+            self._chars += len("".join(chunk.split()))
+            if self.parser.started:
+                self.verdict = "function_call"
+            elif self._chars >= self.prose_chars and not self.parser.may_start():
+                self.verdict = "conversation"
+                return True
+
+        return self.verdict == "function_call" and self.parser.done
+
+
+def stream_completion(complete, classifier, **generation_params):
+    """Stream a completion and stop as soon as the classifier has its answer
+
+    complete is a callable taking llama.cpp completion kwargs, e.g.
+    functools.partial(llm, prompt). Returns (text, verdict, completion_tokens).
+
+    Chunks don't map to tokens: llama-cpp-python holds back text that could
+    start a stop sequence and emits it later as one chunk. Tokens are counted
+    instead by a stopping criterion that never stops, which Llama.generate()
+    calls once per sampled token (and the completion once more when it ends
+    on its own). Unlike the non-streamed usage count, a final end-of-turn
+    token is counted too, since it was sampled like any other.
+    """
+    sampled = 0
+
+    def count_sample(input_ids, logits):
+        nonlocal sampled
+        sampled += 1
+        return False
+
+    text = ""
+    finish_reason = None
+    chunks = complete(stream=True, stopping_criteria=count_sample, **generation_params)
+    for chunk in chunks:
+        chunk_text = chunk["choices"][0]["text"]
+        finish_reason = chunk["choices"][0]["finish_reason"]
+        text += chunk_text
+        if classifier.feed(chunk_text):
+            break
+    # Closing the generator stops llama.cpp from decoding any further tokens
+    chunks.close()
+    # A finish_reason means the completion ended on its own and checked the criterion once more
+    completion_tokens = sampled - 1 if finish_reason else sampled
+    return text, classifier.verdict, completion_tokens
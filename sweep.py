@@ -0,0 +1,122 @@
+import argparse
+import csv
+import itertools
+import os
+import subprocess
+import sys
+
+from result_sink import iter_results, summarize
+
+
+# ----------------- Sweep Orchestrator ----------------- #
+
+# Prompt format -> suite script that renders tools in that format
+FORMATS = {
+    "functiongemma": "test_functiongemma_270m.py",
+    "gemma3": "test_gemma3_4b.py",
+}
+
+TABLE_COLUMNS = ["config", "accuracy", "passed", "total", "tokens_per_second", "mean_time", "peak_rss_mb",
+                 "steady_rss_mb", "state_mb", "exit_code"]
+
+
+def config_name(model, prompt_format, n_threads, n_batch, n_ctx):
+    stem = os.path.splitext(os.path.basename(model))[0]
+    return f"{prompt_format}-{stem}-t{n_threads or 'auto'}-b{n_batch}-c{n_ctx}"
+
+
+def run_config(model, prompt_format, n_threads, n_batch, n_ctx, output_dir, suite_args):
+    """Run one suite configuration in its own process and return its comparison row
+
+    A fresh process per configuration frees every model between runs and gives
+    each run its own peak RSS, read from the child's rusage. With --workers this
+    is the largest single process, not the sum over workers.
+    """
+    name = config_name(model, prompt_format, n_threads, n_batch, n_ctx)
+    results_path = os.path.join(output_dir, f"{name}.json")
+    command = [
+        sys.executable, FORMATS[prompt_format],
+        "--model", model,
+        "--n-batch", str(n_batch),
+        "--n-ctx", str(n_ctx),
+        "--results", results_path,
+    ]
+    if n_threads:
+        command += ["--threads", str(n_threads)]
+    command += suite_args
+
+    print(f"▶ {name}")
+    with open(os.path.join(output_dir, f"{name}.log"), "w", encoding="utf-8") as log:
+        process = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT)
+        _, status, rusage = os.wait4(process.pid, 0)
+    exit_code = os.waitstatus_to_exitcode(status)
+
+    row = {"config": name, "model": model, "format": prompt_format, "n_threads": n_threads,
+           "n_batch": n_batch, "n_ctx": n_ctx, "exit_code": exit_code,
+           # ru_maxrss is in KiB on Linux
+           "peak_rss_mb": rusage.ru_maxrss / 1024}
+    details_path = os.path.splitext(results_path)[0] + "_details.jsonl"
+    if os.path.exists(details_path):
+        summary = summarize(details_path)
+        speeds = [d["tokens_per_second"] for d in iter_results(details_path) if "tokens_per_second" in d]
+        times = [d["time"] for d in iter_results(details_path)]
+        rss_after = [d["rss_after_mb"] for d in iter_results(details_path) if "rss_after_mb" in d]
+        states = [d["state_mb"] for d in iter_results(details_path) if "state_mb" in d]
+        row.update(
+            accuracy=summary["success_rate"],
+            passed=summary["passed"],
+            total=summary["total"],
+            tokens_per_second=sum(speeds) / len(speeds) if speeds else 0.0,
+            mean_time=sum(times) / len(times) if times else 0.0,
+            steady_rss_mb=sorted(rss_after)[len(rss_after) // 2] if rss_after else 0.0,
+            state_mb=max(states, default=0.0),
+        )
+    return row
+
+
+def print_table(rows):
+    """Print accuracy vs tokens/s vs peak RSS, one line per configuration"""
+    width = max(len(row["config"]) for row in rows)
+    print("\n" + "=" * 80)
+    print("SWEEP SUMMARY")
+    print("=" * 80)
+    print(f"{'Config':<{width}}  {'Accuracy':>8}  {'Tok/s':>8}  {'Mean s':>7}  {'Peak RSS':>9}  {'Steady RSS':>10}  {'State':>8}")
+    for row in rows:
+        if "accuracy" not in row:
+            print(f"{row['config']:<{width}}  ✗ failed (exit {row['exit_code']})")
+            continue
+        print(f"{row['config']:<{width}}  {row['accuracy']:>7.1f}%  {row['tokens_per_second']:>8.1f}  "
+              f"{row['mean_time']:>7.2f}  {row['peak_rss_mb']:>6.0f} MB  {row['steady_rss_mb']:>7.0f} MB  "
+              f"{row['state_mb']:>5.1f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run the function-calling suite over a matrix of models, formats and llama.cpp settings",
+        epilog="Arguments after -- are passed to every suite run, e.g. -- --no-prefix-cache --stream",
+    )
+    parser.add_argument("--models", nargs="+", required=True, metavar="GGUF")
+    parser.add_argument("--formats", nargs="+", choices=sorted(FORMATS), default=["functiongemma"],
+                        help="prompt format: FunctionGemma declarations or Gemma 3 Python defs")
+    parser.add_argument("--threads", nargs="+", type=int, default=[None])
+    parser.add_argument("--n-batch", nargs="+", type=int, default=[512])
+    parser.add_argument("--n-ctx", nargs="+", type=int, default=[8192])
+    parser.add_argument("--output-dir", default="sweep_results")
+    parser.add_argument("suite_args", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+    suite_args = args.suite_args[1:] if args.suite_args[:1] == ["--"] else args.suite_args
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    rows = [
+        run_config(model, prompt_format, n_threads, n_batch, n_ctx, args.output_dir, suite_args)
+        for model, prompt_format, n_threads, n_batch, n_ctx in itertools.product(
+            args.models, args.formats, args.threads, args.n_batch, args.n_ctx)
+    ]
+
+    print_table(rows)
+    table_path = os.path.join(args.output_dir, "sweep_summary.csv")
+    with open(table_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["model", "format", "n_threads", "n_batch", "n_ctx"] + TABLE_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"\nComparison table saved to: {table_path}")
@@ -1,9 +1,26 @@
-import json
+import functools
 import requests
 import yfinance as yf
-from llama_cpp import Llama
+import sys
 import time
-import re
+
+from arg_scoring import EnumArgumentScorer
+from batch_runner import TOKENIZER_N_CTX
+from call_parser import ToolCodeCallParser
+from harness import main, print_test_header, run_argument_scoring, run_probe, score_routed, score_test
+from memory_tracker import MemorySampler
+from metrics import TokenTimer
+from model_registry import registry
+from prefix_cache import PrefixCache, cold_complete
+from probe import TokenProbe
+from prompt_renderer import ToolPromptRenderer
+from response_cache import ResponseCache
+from speculative import build_draft, run_without_draft, speculative_fields
+from streaming import StreamClassifier, stream_completion
+from tool_executor import build_executor
+from tool_grammar import build_gemma3_grammar, load_grammar
+from tool_retrieval import RetrievedPrompts, ToolRetriever
+from tool_schema import ToolSchemaIndex
 
 
 # ----------------- Tools / Functions ----------------- #
@@ -86,53 +103,46 @@ AVAILABLE_FUNCTIONS = {
 
 # ----------------- Gemma 3 Format Functions ----------------- #
 
-def create_gemma3_function_definitions(tools_list):
-    """Create Python-style function definitions for Gemma 3"""
-    definitions = []
+def render_gemma3_function_definition(tool):
+    """Create the Python-style function definition for one tool"""
+    func = tool['function']
+    name = func['name']
+    desc = func['description']
+    params = func['parameters']
     
-    for tool in tools_list:
-        func = tool['function']
-        name = func['name']
-        desc = func['description']
-        params = func['parameters']
+    # Build parameter list with types and descriptions
+    param_parts = []
+    for prop_name, prop_info in params.get('properties', {}).items():
+        prop_type = prop_info.get('type', 'string')
+        prop_desc = prop_info.get('description', '')
         
-        # Build parameter list with types and descriptions
-        param_parts = []
-        for prop_name, prop_info in params.get('properties', {}).items():
-            prop_type = prop_info.get('type', 'string')
-            prop_desc = prop_info.get('description', '')
-            
-            # Format: param_name: type = default_value  # description
-            param_str = f"{prop_name}: str"
-            if prop_name not in params.get('required', []):
-                param_str += f" = None"
-            param_str += f"  # {prop_desc}"
-            
-            # Add enum info if exists
-            if 'enum' in prop_info:
-                enum_values = ', '.join([f"'{v}'" for v in prop_info['enum']])
-                param_str += f" Options: [{enum_values}]"
-            
-            param_parts.append(param_str)
+        # Format: param_name: type = default_value  # description
+        param_str = f"{prop_name}: str"
+        if prop_name not in params.get('required', []):
+            param_str += f" = None"
+        param_str += f"  # {prop_desc}"
         
-        # Create function signature
-        params_str = ", ".join(param_parts)
-        function_def = f"def {name}({params_str}):\n    \"\"\"{desc}\"\"\"\n    pass"
-        definitions.append(function_def)
+        # Add enum info if exists
+        if 'enum' in prop_info:
+            enum_values = ', '.join([f"'{v}'" for v in prop_info['enum']])
+            param_str += f" Options: [{enum_values}]"
+        
+        param_parts.append(param_str)
     
-    return "\n\n".join(definitions)
+    # Create function signature
+    params_str = ", ".join(param_parts)
+    function_def = f"def {name}({params_str}):\n    \"\"\"{desc}\"\"\"\n    pass"
+    return function_def
 
 
-def create_gemma3_system_prompt(tools_list):
-    """Create system prompt for Gemma 3 tool calling"""
-    function_definitions = create_gemma3_function_definitions(tools_list)
-    
+def wrap_gemma3_system_prompt(declarations):
+    """Gemma 3 tool-calling instructions around the function definitions"""
     system_prompt = f"""
 You are a helpful AI assistant that can chat naturally and call tools when needed.
 
 - You have access to the following Python functions (they are already imported and available):
 
-{function_definitions}
+{declarations}
 
 Guidelines:
 - If the user clearly asks you to do something that one of these functions can perform, call it inside a ```tool_code``` block using valid Python, for example:
@@ -147,70 +157,44 @@ Guidelines:
     return system_prompt
 
 
+def wrap_gemma3_prompt_prefix(declarations):
+    """The user turn opening with the system prompt, ahead of the query"""
+    return f"<start_of_turn>user\n{wrap_gemma3_system_prompt(declarations)}\n\n"
+
+
+# Each tool is rendered once; prompts for any subset reuse the cached definitions
+gemma3_renderer = ToolPromptRenderer(render_gemma3_function_definition, wrap_gemma3_prompt_prefix, separator="\n\n")
+
+
+def create_gemma3_function_definitions(tools_list):
+    """Create Python-style function definitions for Gemma 3"""
+    return gemma3_renderer.declarations(tools_list)
+
+
+def create_gemma3_system_prompt(tools_list):
+    """Create system prompt for Gemma 3 tool calling"""
+    return wrap_gemma3_system_prompt(create_gemma3_function_definitions(tools_list))
+
+
+def create_gemma3_prompt_prefix(tools_list):
+    """Create the prompt up to the user's query for Gemma 3 tool calling"""
+    return gemma3_renderer.prompt(tools_list)
+
+
 # ----------------- Extraction for Gemma 3 ----------------- #
 
 def extract_tool_call_gemma3(output_text):
     """Extract function call from Gemma 3 ```tool_code``` blocks"""
-    try:
-        # Look for ```tool_code ... ``` pattern with various formats
-        patterns = [
-            r'```tool_code\s*\n(.*?)\n```',  # Complete block with newlines
-            r'```tool_code\s+(.*?)```',       # Complete block inline
-            r'```tool_code\s*\n(.*?)$',       # Incomplete - newline format
-            r'```tool_code\s+(.*?)$',         # Incomplete - inline format
-            r'```tool_code\s*$',               # Just the opening tag
-        ]
-        
-        code_block = None
-        for pattern in patterns:
-            match = re.search(pattern, output_text, re.DOTALL | re.MULTILINE)
-            if match:
-                if match.lastindex and match.lastindex >= 1:
-                    code_block = match.group(1).strip()
-                break
-        
-        # If we only found the opening tag, return None
-        if code_block is None or code_block == '':
-            return None, None
-        
-        # Parse Python function call: function_name(arg1="value1", arg2="value2")
-        func_pattern = r'(\w+)\s*\((.*?)\)'
-        func_match = re.search(func_pattern, code_block, re.DOTALL)
-        
-        if not func_match:
-            return None, None
-        
-        function_name = func_match.group(1)
-        args_str = func_match.group(2).strip()
-        
-        # Parse arguments - handle multiple formats
-        arguments = {}
-        if args_str:
-            # Match: key="value" or key='value'
-            arg_pattern = r"(\w+)\s*=\s*['\"]([^'\"]*)['\"]"
-            arg_matches = re.findall(arg_pattern, args_str)
-            
-            for key, value in arg_matches:
-                arguments[key] = value.strip()
-        
-        return function_name, arguments
-    
-    except Exception as e:
-        print(f"Error extracting tool call: {e}")
-        return None, None
+    # Parse Python function call: function_name(arg1="value1", arg2="value2")
+    parser = ToolCodeCallParser()
+    parser.feed(output_text)
+    return parser.result()
 
 
-def execute_function_call(function_name, arguments):
-    """Safely execute a function call"""
-    if function_name not in AVAILABLE_FUNCTIONS:
-        return f"Error: Function '{function_name}' not found"
-
-    try:
-        func = AVAILABLE_FUNCTIONS[function_name]
-        result = func(**arguments)
-        return result
-    except Exception as e:
-        return f"Error executing {function_name}: {str(e)}"
+def parse_output(output_text):
+    """(assistant content, function name, arguments) for a finished generation"""
+    assistant_content = output_text.strip()
+    return (assistant_content, *extract_tool_call_gemma3(assistant_content))
 
 
 # ----------------- Tools Schema ----------------- #
@@ -343,6 +327,9 @@ tools_list = [
     },
 ]
 
+# Parameter, enum and required-argument sets for validating extracted calls
+SCHEMA_INDEX = ToolSchemaIndex(tools_list)
+
 
 # ----------------- Test Cases ----------------- #
 
@@ -351,12 +338,14 @@ test_cases = [
         "name": "Test 1: Food ordering (prawn noodles)",
         "query": "Can I have a plate of fried prawn noodles without sotong please?",
         "expected_function": "cook_prawn_noodles",
+        "expected_arguments": {"sotong": "without sotong"},
         "type": "function_call"
     },
     {
         "name": "Test 2: Coffee order",
         "query": "I'd like a cappuccino with no sugar and extra milk",
         "expected_function": "make_coffee",
+        "expected_arguments": {"milk": "more", "sugar": "no"},
         "type": "function_call"
     },
     {
@@ -375,12 +364,14 @@ test_cases = [
         "name": "Test 5: Burger order",
         "query": "I want a medium burger please",
         "expected_function": "cook_burger",
+        "expected_arguments": {"cook": "medium"},
         "type": "function_call"
     },
     {
         "name": "Test 6: Fries order",
         "query": "Give me some curly fries",
         "expected_function": "cook_fries",
+        "expected_arguments": {"type_of_fries": "curly"},
         "type": "function_call"
     },
     {
@@ -412,170 +403,280 @@ test_cases = [
 
 # ----------------- Model Init ----------------- #
 
-print("Loading Gemma 3 4B model...")
-llm = Llama(
-    model_path="./model/gemma-3-4b-it-q4_0.gguf",
-    n_ctx=8192,
-    n_gpu_layers=-1,
-    logits_all=False,
-    vocab_only=False,
-    seed=42,
-    verbose=False,
-)
-print("Model loaded successfully!\n")
+MODEL_PATH = "./model/gemma-3-4b-it-q4_0.gguf"
+# Draft model for --speculative draft; FunctionGemma shares Gemma 3's vocabulary
+DRAFT_MODEL_PATH = "./model/functiongemma-270m-it-BF16.gguf"
+SUITE_TITLE = "GEMMA 3 4B TEST SUITE"
+MAX_TOKENS = 512
+CONTINUATION_MAX_TOKENS = 128
+# Tokens the context must hold beyond the prompt (see --auto-ctx): the
+# repair continuation re-feeds the output and generates up to 128 more
+GENERATION_BUDGET = MAX_TOKENS + CONTINUATION_MAX_TOKENS
+TEMPERATURE = 0.1
+SEED = 42
+N_CTX = 8192
+N_BATCH = 512
+STOP_SEQUENCES = ["<end_of_turn>"]
+RESULTS_PATH = "gemma3_4b_test_results.json"
+
+# Prefill the system prompt once and only evaluate the per-query suffix
+USE_PREFIX_CACHE = True
+
+# With --stream, output this long without a ```tool_code opener counts as prose
+# (Gemma 3 sometimes writes a short sentence before the tool_code block)
+STREAM_PROSE_CHARS = 64
+
+# Gemma 3 opens a tool call with a ```tool_code fence. The opener is several tokens and
+# the probe scores only the first, ``` , which also opens ordinary code fences in prose
+PROBE_MARKER = "```"
+
+# With --score-arguments, each enum value is scored followed by this closer,
+# after the call text from build_argument_prefix()
+ARGUMENT_CLOSER = '"'
+
+
+def build_argument_prefix(function_name, parameter):
+    """The tool_code text Gemma 3 writes before a parameter's value"""
+    return f'```tool_code\n{function_name}({parameter}="'
+
+
+def load_model(n_threads=None, draft_model=None, n_ctx=None):
+    """Load the Gemma 3 4B GGUF model, or reuse it if this process already has it loaded
+
+    n_ctx overrides N_CTX, e.g. with a tiny context for runners that decode in their own.
+    """
+    load_params = dict(
+        n_ctx=n_ctx or N_CTX,
+        n_batch=N_BATCH,
+        n_gpu_layers=-1,
+        n_threads=n_threads,
+        logits_all=False,
+        vocab_only=False,
+        seed=SEED,
+        verbose=False,
+    )
+    if draft_model:
+        # Verifying drafts needs logits for every position; llama-cpp-python sizes
+        # its logits buffer from logits_all, so it has to be set explicitly
+        load_params.update(draft_model=draft_model, logits_all=True)
+    if registry.is_loaded(MODEL_PATH, **load_params):
+        print("Reusing loaded Gemma 3 4B model\n")
+        llm = registry.get(MODEL_PATH, **load_params)
+        if draft_model:
+            # Still holds the draft of an earlier runner; this runner reads its own draft's counters
+            llm.draft_model = draft_model
+        return llm
+    print("Loading Gemma 3 4B model...")
+    llm = registry.get(MODEL_PATH, **load_params)
+    print("Model loaded successfully!\n")
+    return llm
+
+
+def load_draft_model(n_threads=None):
+    """Load the draft model for --speculative draft, with the same context size as the target"""
+    print("Loading draft model...")
+    return registry.get(
+        DRAFT_MODEL_PATH,
+        n_ctx=N_CTX,
+        n_batch=N_BATCH,
+        n_gpu_layers=-1,
+        n_threads=n_threads,
+        logits_all=False,
+        vocab_only=False,
+        seed=SEED,
+        verbose=False,
+    )
 
 
 # ----------------- Run Tests ----------------- #
 
 system_prompt = create_gemma3_system_prompt(tools_list)
+prompt_prefix = create_gemma3_prompt_prefix(tools_list)
+prompt_renderer = gemma3_renderer
 
-results = {
-    "passed": 0,
-    "failed": 0,
-    "total": len(test_cases),
-    "details": []
-}
 
-print("=" * 80)
-print("STARTING GEMMA 3 4B TEST SUITE")
-print("=" * 80)
-print()
-
-for idx, test in enumerate(test_cases, 1):
-    print(f"\n{'=' * 80}")
-    print(f"{test['name']}")
-    print(f"{'=' * 80}")
-    print(f"Query: {test['query']}")
-    print(f"Expected: {'Function call to ' + test['expected_function'] if test['expected_function'] else 'Normal conversation'}")
-    print()
+def build_prompt_suffix(test):
+    """The per-test part of the prompt, appended to prompt_prefix"""
+    return f"{test['query']}<end_of_turn>\n<start_of_turn>model\n"
+
+
+def run_test(llm, test, tool_executor, prompt_cache=None, stream=False, grammar=None, response_cache=None,
+             defer_scoring=False, tool_retrieval=None, router=None, speculative=None):
+    """Run one test case through the model and score it"""
+    print_test_header(test)
+    
+    routing = router.route(test) if router else None
+    if routing and routing["routed"]:
+        result_detail = score_routed(test, routing)
+        return (lambda: result_detail) if defer_scoring else result_detail
     
     # Build Gemma 3 prompt
-    full_prompt = f"<start_of_turn>user\n{system_prompt}\n\n{test['query']}<end_of_turn>\n<start_of_turn>model\n"
+    prompt_suffix = build_prompt_suffix(test)
+    full_prompt = prompt_prefix + prompt_suffix
     
-    start = time.time()
-    response = llm(
-        full_prompt,
-        max_tokens=512,
-        temperature=0.1,
-        stop=["<end_of_turn>"],
+    generation_params = dict(
+        max_tokens=MAX_TOKENS,
+        temperature=TEMPERATURE,
+        stop=STOP_SEQUENCES,
+        seed=test.get("seed", SEED),
         echo=False,
     )
-    end = time.time()
     
-    assistant_content = response["choices"][0]["text"].strip()
-
-    # Check if we have an incomplete tool_code block
-    if "```tool_code" in assistant_content:
-        # Count backticks after tool_code
-        tool_code_idx = assistant_content.rfind("```tool_code")
-        remaining_text = assistant_content[tool_code_idx:]
-        
-        # Check if there's a closing ``` after the opening
-        closing_match = re.search(r'```tool_code.*?```', remaining_text, re.DOTALL)
-        
-        if not closing_match:
-            # Incomplete block - need to continue generation
-            print("⚠ Incomplete tool_code block detected, continuing generation...")
-            
-            # Continue from where we left off
-            continue_response = llm(
-                full_prompt + assistant_content,
-                max_tokens=128,
-                temperature=0.1,
-                stop=["```", "\n\n", "<end_of_turn>"],
-                echo=False,
-            )
-            
-            continuation = continue_response["choices"][0]["text"].strip()
-            assistant_content += continuation
-            
-            # Add closing backticks if still missing
-            if "```" not in continuation:
-                assistant_content += "\n```"
-
-    inference_time = end - start
+    if grammar:
+        generation_params["grammar"] = grammar
     
-    print(f"Model output: {assistant_content}")
-    print(f"Time taken: {inference_time:.2f}s")
-    print()
+    if tool_retrieval:
+        # Declare only the tools retrieved for this query
+        tools = tool_retrieval.tools(test["query"])
+        full_prompt = tool_retrieval.prompt(tools, prompt_suffix)
+        complete = functools.partial(tool_retrieval, tools, prompt_suffix)
+    elif prompt_cache:
+        complete = functools.partial(prompt_cache, prompt_suffix)
+    else:
+        complete = functools.partial(cold_complete, llm, full_prompt)
     
-    function_name, arguments = extract_tool_call_gemma3(assistant_content)
+    parser = ToolCodeCallParser()
     
-    test_passed = False
-    result_detail = {
-        "test_name": test['name'],
-        "query": test['query'],
-        "output": assistant_content,
-        "time": inference_time,
-    }
+    if speculative:
+        # The same generation without the draft model first, as this test's baseline
+        baseline_response, baseline_time = run_without_draft(llm, complete, **generation_params)
+        speculative.reset()
     
-    if function_name:
-        print(f"✓ Function detected: {function_name}")
-        print(f"✓ Arguments: {arguments}")
-        
-        try:
-            func_result = execute_function_call(function_name, arguments)
-            print(f"\nFunction execution result:")
-            print(func_result)
-            result_detail["function_called"] = function_name
-            result_detail["arguments"] = arguments
-            result_detail["function_result"] = func_result
-        except Exception as e:
-            print(f"\n✗ Function execution failed: {e}")
-            result_detail["error"] = str(e)
-        
-        if test['type'] == 'function_call' and function_name == test['expected_function']:
-            test_passed = True
-            print(f"\n✓ TEST PASSED - Correct function called")
-        elif test['type'] == 'conversation':
-            test_passed = False
-            print(f"\n✗ TEST FAILED - Function called when conversation expected")
-        else:
-            test_passed = False
-            print(f"\n✗ TEST FAILED - Wrong function (expected: {test['expected_function']})")
+    timer = TokenTimer(llm)
+    memory = MemorySampler(llm._ctx.ctx)
+    timer.start()
+    memory.start()
+    start = time.time()
+    if stream:
+        classifier = StreamClassifier(parser, prose_chars=STREAM_PROSE_CHARS)
+        assistant_content, stream_verdict, completion_tokens = stream_completion(complete, classifier, **generation_params)
+    elif response_cache:
+        # A cache hit reports the timing of the run that generated it
+        response, generation_time = response_cache(complete, full_prompt, **generation_params)
+        assistant_content = response["choices"][0]["text"]
+        completion_tokens = response["usage"]["completion_tokens"]
+        parser.feed(assistant_content)
     else:
-        print("ℹ No function call detected - treating as normal conversation")
-        print(f"Response: {assistant_content}")
-        result_detail["conversation_response"] = assistant_content
+        response = complete(**generation_params)
+        assistant_content = response["choices"][0]["text"]
+        completion_tokens = response["usage"]["completion_tokens"]
+        parser.feed(assistant_content)
+    assistant_content = assistant_content.strip()
+    token_metrics = timer.stop(completion_tokens)
+    memory_metrics = memory.stop()
+    end = time.time()
+    if speculative:
+        # Measured before any repair continuation, like the baseline
+        speculative_metrics = speculative_fields(speculative, baseline_response, baseline_time, assistant_content,
+                                                 completion_tokens, end - start)
+
+    # The parser already knows whether the call closed; only a call that was
+    # cut off mid-arguments (e.g. by max_tokens) needs more tokens. A missing
+    # closing ``` fence alone no longer triggers a continuation. Under a
+    # grammar the call is scored as generated: an unconstrained continuation
+    # could break the well-formedness the grammar guarantees.
+    if parser.started and not parser.done and not grammar:
+        print("⚠ Incomplete tool_code block detected, continuing generation...")
         
-        if test['type'] == 'conversation':
-            test_passed = True
-            print(f"\n✓ TEST PASSED - Normal conversation as expected")
+        # Continue from where we left off
+        continuation_params = dict(
+            max_tokens=CONTINUATION_MAX_TOKENS,
+            temperature=TEMPERATURE,
+            stop=["```", "\n\n", "<end_of_turn>"],
+            seed=test.get("seed", SEED),
+            echo=False,
+        )
+        if tool_retrieval:
+            continue_complete = functools.partial(tool_retrieval, tools, prompt_suffix + assistant_content)
+        elif prompt_cache:
+            continue_complete = functools.partial(prompt_cache, prompt_suffix + assistant_content)
         else:
-            test_passed = False
-            print(f"\n✗ TEST FAILED - Expected function call to {test['expected_function']}")
+            continue_complete = functools.partial(cold_complete, llm, full_prompt + assistant_content)
+        if response_cache:
+            continue_response, _ = response_cache(continue_complete, full_prompt + assistant_content, **continuation_params)
+        else:
+            continue_response = continue_complete(**continuation_params)
+        
+        continuation = continue_response["choices"][0]["text"].strip()
+        parser.feed(continuation)
+        assistant_content += continuation
+        
+        # Add closing backticks if still missing
+        if "```" not in continuation:
+            assistant_content += "\n```"
+
+    inference_time = generation_time if response_cache and not stream else end - start
     
-    result_detail["passed"] = test_passed
-    results["details"].append(result_detail)
+    print(f"Model output: {assistant_content}")
+    print(f"Time taken: {inference_time:.2f}s")
+    print()
     
-    if test_passed:
-        results["passed"] += 1
-    else:
-        results["failed"] += 1
-
-
-# ----------------- Summary ----------------- #
-
-print("\n" + "=" * 80)
-print("TEST SUMMARY")
-print("=" * 80)
-print(f"Total Tests: {results['total']}")
-print(f"Passed: {results['passed']} ✓")
-print(f"Failed: {results['failed']} ✗")
-print(f"Success Rate: {(results['passed'] / results['total'] * 100):.1f}%")
-print()
-
-print("\nDetailed Results:")
-print("-" * 80)
-for detail in results["details"]:
-    status = "✓ PASS" if detail["passed"] else "✗ FAIL"
-    print(f"{status} | {detail['test_name']} | {detail['time']:.2f}s")
-
-print("\n" + "=" * 80)
-print("TEST SUITE COMPLETE")
-print("=" * 80)
-
-with open("gemma3_4b_test_results.json", "w") as f:
-    json.dump(results, f, indent=2)
-
-print("\nResults saved to: gemma3_4b_test_results.json")
+    function_name, arguments = parser.result()
+    
+    def finish():
+        result_detail = score_test(test, assistant_content, inference_time, function_name, arguments,
+                                   tool_executor, SCHEMA_INDEX)
+        result_detail["completion_tokens"] = completion_tokens
+        result_detail["tokens_per_second"] = completion_tokens / inference_time if inference_time > 0 else 0.0
+        result_detail["truncated"] = completion_tokens >= MAX_TOKENS
+        # Draft verification decodes several tokens at once, which llama.cpp's
+        # perf counters book as prompt eval, so speculative runs can't be split
+        # into prefill and decode
+        if not speculative and (stream or not (response_cache and response.get("cached"))):
+            # Prompt tokens, prefill / decode throughput and time to first token
+            result_detail.update(token_metrics)
+        result_detail.update(memory_metrics)
+        if tool_retrieval:
+            result_detail.update(tool_retrieval.record(test, tools))
+        if routing:
+            result_detail.update(routing)
+        if speculative:
+            result_detail.update(speculative_metrics)
+        if stream:
+            result_detail["stream_verdict"] = stream_verdict
+        if response_cache and not stream:
+            result_detail["response_cached"] = response.get("cached", False)
+        return result_detail
+    
+    if defer_scoring:
+        # Start the tool call now; the caller scores this test after the next
+        # one has been generated (see pipeline.py)
+        if function_name:
+            tool_executor.submit(function_name, arguments)
+        return finish
+    return finish()
+
+
+def create_runner(n_threads=None, use_prefix_cache=USE_PREFIX_CACHE, stream=False, use_grammar=False,
+                  response_cache_path=None, tool_backend="live", pipeline=False, top_k_tools=None,
+                  router=None, probe=False, score_arguments=False, speculative=None, draft_tokens=8):
+    """Load the model and return a function that runs one test case"""
+    if score_arguments:
+        # The scorer decodes in its own context; the model's is only used to tokenize
+        llm = load_model(n_threads, n_ctx=TOKENIZER_N_CTX)
+        scorer = EnumArgumentScorer(llm, tools_list, build_argument_prefix, ARGUMENT_CLOSER, n_threads=n_threads,
+                                    n_ctx=N_CTX)
+        return functools.partial(run_argument_scoring, sys.modules[__name__], scorer)
+    draft = None
+    if speculative:
+        draft = build_draft(speculative, load_draft_model(n_threads) if speculative == "draft" else None, draft_tokens)
+    llm = load_model(n_threads, draft_model=draft)
+    if speculative == "draft" and draft.draft.n_vocab != llm.n_vocab():
+        raise ValueError(f"Draft model {DRAFT_MODEL_PATH} does not share the target model's vocabulary")
+    tool_retrieval = (RetrievedPrompts(llm, prompt_renderer, ToolRetriever(tools_list), top_k_tools)
+                      if top_k_tools else None)
+    # A retrieved subset replaces the shared prefix, so there is nothing to snapshot
+    prompt_cache = PrefixCache(llm, prompt_prefix) if use_prefix_cache and not tool_retrieval else None
+    if probe:
+        return functools.partial(run_probe, sys.modules[__name__], TokenProbe(llm, PROBE_MARKER),
+                                 prompt_cache=prompt_cache, tool_retrieval=tool_retrieval)
+    grammar = load_grammar(build_gemma3_grammar(tools_list)) if use_grammar else None
+    response_cache = ResponseCache(response_cache_path, MODEL_PATH) if response_cache_path else None
+    tool_executor = build_executor(AVAILABLE_FUNCTIONS, tool_backend)
+    return functools.partial(run_test, llm, prompt_cache=prompt_cache, stream=stream, grammar=grammar,
+                             response_cache=response_cache, tool_executor=tool_executor, defer_scoring=pipeline,
+                             tool_retrieval=tool_retrieval, router=router, speculative=draft)
+
+
+if __name__ == "__main__":
+    main(sys.modules[__name__])
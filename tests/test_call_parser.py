@@ -0,0 +1,88 @@
+import pytest
+
+from call_parser import FunctionGemmaCallParser, ToolCodeCallParser
+
+
+def parse(parser_class, text, chunk_size=None):
+    parser = parser_class()
+    if chunk_size is None:
+        parser.feed(text)
+    else:
+        for i in range(0, len(text), chunk_size):
+            parser.feed(text[i:i + chunk_size])
+    return parser.result()
+
+
+# ----------------- FunctionGemma ----------------- #
+
+# Expected results are those of the regex extractor the parser replaced
+FUNCTIONGEMMA_CASES = [
+    ("<start_function_call>call:get_weather{city:<escape>Tokyo<escape>}<end_function_call>",
+     ("get_weather", {"city": "Tokyo"})),
+    ("<start_function_call>call: get_weather{city:<escape>Tokyo<escape>}<end_function_call>",
+     ("get_weather", {"city": "Tokyo"})),
+    ("<start_function_call>call:get_weather {city:<escape>Tokyo<escape>}<end_function_call>",
+     ("get_weather", {"city": "Tokyo"})),
+    ("<start_function_call>  call:make_coffee{type_of_coffee:<escape> latte <escape>}",
+     ("make_coffee", {"type_of_coffee": "latte"})),
+    ("Sure! <start_function_call>call:cook_burger{cook:<escape>medium<escape>,extra:<escape>cheese<escape>}",
+     ("cook_burger", {"cook": "medium", "extra": "cheese"})),
+    ("<start_function_call>call:get_weather<end_function_call>", ("get_weather", {})),
+    ("<start_function_call>call:get_weather", ("get_weather", {})),
+    ("<start_function_call>get_weather{}", (None, None)),
+    ("Hello! How can I help you today?", (None, None)),
+]
+
+
+@pytest.mark.parametrize("text, expected", FUNCTIONGEMMA_CASES)
+def test_functiongemma_matches_regex_extractor(text, expected):
+    assert parse(FunctionGemmaCallParser, text) == expected
+
+
+@pytest.mark.parametrize("text, expected", FUNCTIONGEMMA_CASES)
+def test_functiongemma_streamed_one_character_at_a_time(text, expected):
+    assert parse(FunctionGemmaCallParser, text, chunk_size=1) == expected
+
+
+def test_functiongemma_completes_on_closing_brace():
+    parser = FunctionGemmaCallParser()
+    assert not parser.feed("<start_function_call>call:get_weather{city:<escape>Tok")
+    assert parser.started
+    assert parser.feed("yo<escape>}")
+
+
+# ----------------- Gemma 3 tool_code ----------------- #
+
+TOOL_CODE_CASES = [
+    ('```tool_code\nget_weather(city="Tokyo")\n```', ("get_weather", {"city": "Tokyo"})),
+    ('```tool_code\ndefault_api.get_weather(city="Tokyo")\n```', ("get_weather", {"city": "Tokyo"})),
+    ('```tool_code\nx = get_weather(city="Tokyo")\n```', ("get_weather", {"city": "Tokyo"})),
+    ("```tool_code\nresult=default_api.get_stock_price(ticker='AAPL')\n```", ("get_stock_price", {"ticker": "AAPL"})),
+    ('```tool_code get_weather(city="Tokyo")```', ("get_weather", {"city": "Tokyo"})),
+    ('```tool_code\nget_weather (city = "Tokyo", days="3")\n```', ("get_weather", {"city": "Tokyo", "days": "3"})),
+    ('I think ```tool_code\ncook_fries(type_of_fries="curly")', ("cook_fries", {"type_of_fries": "curly"})),
+    ('```tool_code\nprint(default_api.get_weather(city="Tokyo"))\n```', ("get_weather", {"city": "Tokyo"})),
+    ('```tool_code\nget_weather([1, 2], city="Tokyo")\n```', ("get_weather", {"city": "Tokyo"})),
+    ('```tool_code\nget_weather(city-name="Tokyo")\n```', (None, None)),
+    ("```tool_code\n", (None, None)),
+    ("Just prose, no call.", (None, None)),
+]
+
+
+@pytest.mark.parametrize("text, expected", TOOL_CODE_CASES)
+def test_tool_code_matches_regex_extractor(text, expected):
+    assert parse(ToolCodeCallParser, text) == expected
+
+
+@pytest.mark.parametrize("text, expected", TOOL_CODE_CASES)
+def test_tool_code_streamed_one_character_at_a_time(text, expected):
+    assert parse(ToolCodeCallParser, text, chunk_size=1) == expected
+
+
+def test_tool_code_opener_split_across_chunks():
+    parser = ToolCodeCallParser()
+    parser.feed("Let me check. ``")
+    assert parser.may_start()
+    parser.feed('`tool_code\nget_weather(city="Paris")')
+    assert parser.complete
+    assert parser.result() == ("get_weather", {"city": "Paris"})
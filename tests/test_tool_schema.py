@@ -0,0 +1,35 @@
+from tool_schema import ENUM_VIOLATION, MISSING_REQUIRED, UNKNOWN_ARGUMENT, UNKNOWN_FUNCTION, ToolSchemaIndex
+
+TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "cook_fries",
+            "description": "Cook fries",
+            "parameters": {
+                "type": "object",
+                "properties": {"type_of_fries": {"type": "string", "enum": ["curly", "straight"]}},
+                "required": ["type_of_fries"],
+            },
+        },
+    },
+    {
+        # Zero-argument tools may leave out properties altogether
+        "type": "function",
+        "function": {"name": "get_time", "description": "Current time", "parameters": {"type": "object"}},
+    },
+]
+
+
+def test_valid_calls():
+    index = ToolSchemaIndex(TOOLS)
+    assert index.validate("cook_fries", {"type_of_fries": "curly"}) == []
+    assert index.validate("get_time", {}) == []
+
+
+def test_errors():
+    index = ToolSchemaIndex(TOOLS)
+    assert index.validate("order_pizza", {}) == [(UNKNOWN_FUNCTION, "order_pizza")]
+    assert index.validate("cook_fries", {"type_of_fries": "wavy"}) == [(ENUM_VIOLATION, "type_of_fries='wavy'")]
+    assert index.validate("cook_fries", {}) == [(MISSING_REQUIRED, "type_of_fries")]
+    assert index.validate("get_time", {"zone": "UTC"}) == [(UNKNOWN_ARGUMENT, "zone")]
@@ -0,0 +1,46 @@
+# ----------------- Local Stand-In Backends ----------------- #
+
+# Fixed data in the same shape as the live APIs, so tool results (and their
+# formatting) stay deterministic and need no network access
+LOCAL_WEATHER = {
+    "new york": {"temp": 18.0, "pressure": 1016, "humidity": 62, "description": "few clouds"},
+    "singapore": {"temp": 30.0, "pressure": 1009, "humidity": 79, "description": "scattered clouds"},
+    "tokyo": {"temp": 21.0, "pressure": 1013, "humidity": 58, "description": "clear sky"},
+    "paris": {"temp": 15.0, "pressure": 1019, "humidity": 71, "description": "light rain"},
+    "london": {"temp": 13.0, "pressure": 1012, "humidity": 81, "description": "overcast clouds"},
+}
+
+LOCAL_OPEN_PRICES = {
+    "AAPL": 227.5,
+    "GOOGL": 165.2,
+    "MSFT": 415.1,
+    "TSLA": 248.9,
+    "AMZN": 186.4,
+}
+
+
+def local_get_weather(city="Singapore", api_key=None):
+    """Stand-in for get_weather, answering from LOCAL_WEATHER"""
+    weather = LOCAL_WEATHER.get(city.lower())
+    if weather is None:
+        return "City not found. Please check the city name."
+    return (
+        f"The weather in {city} is as follows:\n"
+        f"Temperature: {weather['temp']}°C\n"
+        f"Pressure: {weather['pressure']} hPa\n"
+        f"Humidity: {weather['humidity']}%\n"
+        f"Description: {weather['description'].capitalize()}"
+    )
+
+
+def local_get_stock_price(symbol):
+    """Stand-in for get_stock_price, answering from LOCAL_OPEN_PRICES"""
+    if symbol.upper() not in LOCAL_OPEN_PRICES:
+        return f"Could not retrieve the open price for {symbol}. Key 'open' not found."
+    return f"Open price for {symbol} is " + str(LOCAL_OPEN_PRICES[symbol.upper()])
+
+
+LOCAL_BACKENDS = {
+    "get_weather": local_get_weather,
+    "get_stock_price": local_get_stock_price,
+}
@@ -0,0 +1,87 @@
+import concurrent.futures
+import json
+import threading
+import time
+
+from tool_backends import LOCAL_BACKENDS
+
+
+# ----------------- Tool Executor ----------------- #
+
+# Per-tool timeouts in seconds; anything not listed gets the executor's default
+TOOL_TIMEOUTS = {
+    "get_weather": 10.0,
+    "get_stock_price": 10.0,
+}
+
+
+class ToolExecutor:
+    """Run tool calls on a thread pool, with per-tool timeouts and a TTL cache keyed by arguments
+
+    Called with (function_name, arguments); returns the function's result,
+    or an "Error: ..." string for unknown functions and failed calls. A call
+    that exceeds its timeout returns an error string instead of blocking the
+    run; its thread is left to finish in the background. submit() starts a
+    call without waiting, so several calls can be in flight at once. A later
+    call with the same arguments then picks up the running or cached result.
+    """
+
+    def __init__(self, functions, timeouts=TOOL_TIMEOUTS, default_timeout=30.0, ttl=300.0, max_workers=8):
+        self.functions = functions
+        self.timeouts = timeouts
+        self.default_timeout = default_timeout
+        self.ttl = ttl
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers, thread_name_prefix="tool")
+        self._cache = {}
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def _call(self, function_name, arguments):
+        if function_name not in self.functions:
+            return f"Error: Function '{function_name}' not found"
+        try:
+            return self.functions[function_name](**arguments)
+        except Exception as e:
+            return f"Error executing {function_name}: {str(e)}"
+
+    def _finish(self, key, future):
+        result = future.result()
+        with self._lock:
+            self._in_flight.pop(key, None)
+            # Failures are retried on the next call rather than cached
+            if not (isinstance(result, str) and result.startswith("Error")):
+                self._cache[key] = (time.monotonic() + self.ttl, result)
+
+    def submit(self, function_name, arguments):
+        """Start a call (or join the identical one in flight) and return its Future"""
+        key = (function_name, json.dumps(arguments, sort_keys=True))
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached and cached[0] > time.monotonic():
+                future = concurrent.futures.Future()
+                future.set_result(cached[1])
+                return future
+            if key in self._in_flight:
+                return self._in_flight[key]
+            future = self._pool.submit(self._call, function_name, arguments)
+            self._in_flight[key] = future
+        future.add_done_callback(lambda f: self._finish(key, f))
+        return future
+
+    def __call__(self, function_name, arguments):
+        """Execute a call, waiting at most the tool's timeout"""
+        timeout = self.timeouts.get(function_name, self.default_timeout)
+        try:
+            return self.submit(function_name, arguments).result(timeout)
+        except concurrent.futures.TimeoutError:
+            return f"Error: {function_name} timed out after {timeout:g}s"
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def build_executor(functions, backend="live"):
+    """ToolExecutor over a suite's functions; backend "local" swaps the network tools for stand-ins"""
+    if backend == "local":
+        functions = dict(functions, **LOCAL_BACKENDS)
+    return ToolExecutor(functions)
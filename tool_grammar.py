@@ -0,0 +1,110 @@
+import re
+
+from llama_cpp import LlamaGrammar
+
+
+# ----------------- GBNF Grammar Builders ----------------- #
+#
+# Compile an OpenAI-style tools_list into a llama.cpp GBNF grammar that only
+# accepts "prose OR a well-formed call to one of these functions". Enum
+# parameters are restricted to their listed values; other parameters accept
+# any string. Arguments may appear in any order and all are optional.
+
+def _rule_name(*parts):
+    """GBNF rule names may only contain letters, digits and dashes"""
+    return "-".join(re.sub(r"[^a-zA-Z0-9]+", "-", part).strip("-") for part in parts)
+
+
+def _literal(text):
+    """Quote text as a GBNF string literal"""
+    escaped = text.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return f'"{escaped}"'
+
+
+def _alternatives(options):
+    return " | ".join(options)
+
+
+def _function_rules(tools_list, function_rule, argument_rule):
+    """Rules shared by both formats: one rule per function and per parameter"""
+    function_names = []
+    rules = []
+
+    for tool in tools_list:
+        func = tool['function']
+        name = func['name']
+        properties = func['parameters'].get('properties', {})
+
+        fn_rule = _rule_name("fn", name)
+        function_names.append(fn_rule)
+
+        param_rules = []
+        for prop_name, prop_info in properties.items():
+            param_rule = _rule_name("arg", name, prop_name)
+            param_rules.append(param_rule)
+            rules.append(f"{param_rule} ::= {argument_rule(prop_name, prop_info.get('enum'))}")
+
+        if param_rules:
+            args_rule = _rule_name("args", name)
+            rules.append(f"{args_rule} ::= {_alternatives(param_rules)}")
+            rules.append(f"{fn_rule} ::= {function_rule(name, args_rule)}")
+        else:
+            rules.append(f"{fn_rule} ::= {function_rule(name, None)}")
+
+    return function_names, rules
+
+
+def build_functiongemma_grammar(tools_list):
+    """Grammar for prose or <start_function_call>call:name{key:<escape>value<escape>,...}"""
+    def function_rule(name, args_rule):
+        if args_rule is None:
+            return f'{_literal(name + "{")} "}}"'
+        return f'{_literal(name + "{")} ({args_rule} ("," {args_rule})*)? "}}"'
+
+    def argument_rule(prop_name, enum):
+        if enum:
+            value = "(" + _alternatives(_literal(str(v)) for v in enum) + ")"
+        else:
+            value = "escaped-string"
+        return f'{_literal(prop_name + ":<escape>")} {value} "<escape>"'
+
+    function_names, rules = _function_rules(tools_list, function_rule, argument_rule)
+
+    lines = [
+        'root ::= call | prose',
+        f'call ::= "<start_function_call>call:" ({_alternatives(function_names)}) "<end_function_call>"?',
+        # Prose must not start with the call marker
+        'prose ::= [^<] [^<]*',
+        'escaped-string ::= [^<]*',
+    ]
+    return "\n".join(lines + rules) + "\n"
+
+
+def build_gemma3_grammar(tools_list):
+    """Grammar for prose, optionally followed by a ```tool_code name(key="value", ...) block"""
+    def function_rule(name, args_rule):
+        if args_rule is None:
+            return f'{_literal(name + "(")} ")"'
+        return f'{_literal(name + "(")} ({args_rule} ("," " "? {args_rule})*)? ")"'
+
+    def argument_rule(prop_name, enum):
+        if enum:
+            value = "(" + _alternatives(_literal(str(v)) for v in enum) + ")"
+        else:
+            value = "string-chars"
+        return f'{_literal(prop_name + "=")} "\\"" {value} "\\""'
+
+    function_names, rules = _function_rules(tools_list, function_rule, argument_rule)
+
+    lines = [
+        'root ::= prose tool-call?',
+        f'tool-call ::= "```tool_code\\n" ({_alternatives(function_names)}) "\\n```"',
+        'prose ::= [^`]*',
+        'string-chars ::= [^"]*',
+    ]
+    return "\n".join(lines + rules) + "\n"
+
+
+def load_grammar(gbnf):
+    """Compile a GBNF string for llama.cpp"""
+    return LlamaGrammar.from_string(gbnf, verbose=False)
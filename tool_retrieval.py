@@ -0,0 +1,162 @@
+import argparse
+import importlib
+import re
+
+import numpy as np
+from llama_cpp import Llama
+
+
+# ----------------- Tool Retrieval ----------------- #
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """Lowercase alphanumeric terms; snake_case names split into their words"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def tool_document(tool):
+    """The text a tool is indexed by: name, description, parameter names and descriptions, enum values"""
+    function = tool["function"]
+    parts = [function["name"].replace("_", " "), function["description"]]
+    for name, prop in function["parameters"].get("properties", {}).items():
+        parts.append(name.replace("_", " "))
+        parts.append(prop.get("description", ""))
+        parts.extend(str(value) for value in prop.get("enum", ()))
+    return " ".join(parts)
+
+
+class ToolRetriever:
+    """BM25 index over tools_list, for picking the top-k tools to declare for a query
+
+    The BM25 weight of every (tool, term) pair is computed once into a dense
+    NumPy matrix, so scoring a query is a column gather and a row sum.
+    top_k() returns tools in tools_list order rather than score order, so
+    queries that retrieve the same tools share one prompt prefix.
+    """
+
+    def __init__(self, tools_list, k1=1.5, b=0.75):
+        self.tools = list(tools_list)
+        documents = [tokenize(tool_document(tool)) for tool in self.tools]
+        self.vocabulary = {}
+        for terms in documents:
+            for term in terms:
+                self.vocabulary.setdefault(term, len(self.vocabulary))
+
+        tf = np.zeros((len(documents), len(self.vocabulary)), dtype=np.float32)
+        for row, terms in enumerate(documents):
+            for term in terms:
+                tf[row, self.vocabulary[term]] += 1
+        lengths = tf.sum(axis=1, keepdims=True)
+        df = np.count_nonzero(tf, axis=0)
+        idf = np.log(1 + (len(documents) - df + 0.5) / (df + 0.5))
+        norm = k1 * (1 - b + b * lengths / max(lengths.mean(), 1))
+        self.weights = idf * tf * (k1 + 1) / (tf + norm)
+
+    def scores(self, query):
+        """BM25 score of every tool for a query"""
+        columns = [self.vocabulary[term] for term in tokenize(query) if term in self.vocabulary]
+        return self.weights[:, columns].sum(axis=1)
+
+    def top_k(self, query, k):
+        """The k best-scoring tools for a query (ties go to the earlier tool)"""
+        best = np.argsort(-self.scores(query), kind="stable")[:k]
+        return [self.tools[i] for i in sorted(best)]
+
+
+class RetrievedPrompts:
+    """Complete prompts that declare only the top-k tools retrieved for each query
+
+    The prefix for a tool subset and its token ids come from the suite's
+    ToolPromptRenderer, so each subset is rendered and tokenized once.
+    Llama.generate() reuses the longest matching prefix of the previous
+    input ids, so consecutive queries with the same subset skip its prefill.
+    """
+
+    def __init__(self, llm, renderer, retriever, k):
+        self.llm = llm
+        self.renderer = renderer
+        self.retriever = retriever
+        self.k = k
+        self.full_prefix_tokens = len(self.prefix_tokens(retriever.tools))
+
+    def _tokenize_prefix(self, prefix):
+        return self.llm.tokenize(prefix.encode("utf-8"), add_bos=True, special=True)
+
+    def prefix_tokens(self, tools):
+        return self.renderer.tokens(tools, self._tokenize_prefix)
+
+    def tools(self, query):
+        return self.retriever.top_k(query, self.k)
+
+    def prompt(self, tools, suffix):
+        """The prompt text, as used for response cache keys"""
+        return self.renderer.prompt(tools) + suffix
+
+    def record(self, test, tools):
+        """Per-test retrieval fields for the result record"""
+        names = [tool["function"]["name"] for tool in tools]
+        record = {
+            "retrieved_tools": names,
+            "prefix_tokens": len(self.prefix_tokens(tools)),
+            "full_prefix_tokens": self.full_prefix_tokens,
+        }
+        if test["expected_function"]:
+            record["retrieval_hit"] = test["expected_function"] in names
+        return record
+
+    def tokens(self, tools, suffix):
+        """Token ids for the subset's prefix + suffix"""
+        suffix_tokens = self.llm.tokenize(suffix.encode("utf-8"), add_bos=False, special=True)
+        return self.prefix_tokens(tools) + suffix_tokens
+
+    def __call__(self, tools, suffix, **kwargs):
+        """Complete the subset's prefix + suffix"""
+        return self.llm(self.tokens(tools, suffix), **kwargs)
+
+
+def recall_at_k(retriever, test_cases, ks):
+    """Fraction of function-call tests whose expected function is in the top k, for each k"""
+    hits = dict.fromkeys(ks, 0)
+    total = 0
+    for test in test_cases:
+        if not test["expected_function"]:
+            continue
+        total += 1
+        ranked = np.argsort(-retriever.scores(test["query"]), kind="stable")
+        names = [retriever.tools[i]["function"]["name"] for i in ranked]
+        for k in ks:
+            hits[k] += test["expected_function"] in names[:k]
+    return {k: hits[k] / total if total else 0.0 for k in ks}, total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report tool retrieval recall@k and prompt prefix size for a suite")
+    parser.add_argument("suite", help="suite module, e.g. test_functiongemma_270m")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 2, 3, 4])
+    parser.add_argument("--model", default=None, metavar="PATH",
+                        help="GGUF whose tokenizer counts prefix tokens (default: the suite's MODEL_PATH)")
+    args = parser.parse_args()
+
+    suite = importlib.import_module(args.suite)
+    retriever = ToolRetriever(suite.tools_list)
+    recall, total = recall_at_k(retriever, suite.test_cases, args.k)
+
+    # Only the vocabulary is loaded to count tokens
+    vocab = Llama(model_path=args.model or suite.MODEL_PATH, vocab_only=True, verbose=False)
+    try:
+        def tokenize_prefix(prefix):
+            return vocab.tokenize(prefix.encode("utf-8"), add_bos=True, special=True)
+
+        full = len(suite.prompt_renderer.tokens(retriever.tools, tokenize_prefix))
+        print(f"{len(retriever.tools)} tools, {total} function-call tests, full prefix {full} tokens\n")
+        print(f"{'k':>4}{'recall@k':>12}{'mean prefix tokens':>22}{'prefill saved':>16}")
+        for k in args.k:
+            mean_tokens = np.mean([
+                len(suite.prompt_renderer.tokens(retriever.top_k(test["query"], k), tokenize_prefix))
+                for test in suite.test_cases
+            ])
+            print(f"{k:>4}{recall[k]:>12.1%}{mean_tokens:>22.0f}{1 - mean_tokens / full:>16.1%}")
+    finally:
+        vocab.close()
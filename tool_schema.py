@@ -0,0 +1,47 @@
+# ----------------- Tool Schema Index ----------------- #
+
+# Ways an extracted call can disagree with tools_list
+UNKNOWN_FUNCTION = "unknown_function"
+UNKNOWN_ARGUMENT = "unknown_argument"
+ENUM_VIOLATION = "enum_violation"
+MISSING_REQUIRED = "missing_required"
+
+
+class ToolSchemaIndex:
+    """tools_list flattened once into per-function parameter, enum and required-argument sets
+
+    validate() then checks a call with one dict lookup for the function and
+    constant-time set lookups per argument, instead of walking the nested
+    schema dicts for every call.
+    """
+
+    def __init__(self, tools_list):
+        self.functions = {}
+        for tool in tools_list:
+            function = tool["function"]
+            properties = function["parameters"].get("properties", {})
+            self.functions[function["name"]] = {
+                "parameters": frozenset(properties),
+                "enums": {
+                    name: frozenset(prop["enum"])
+                    for name, prop in properties.items()
+                    if "enum" in prop
+                },
+                "required": frozenset(function["parameters"].get("required", ())),
+            }
+
+    def validate(self, function_name, arguments):
+        """Return a list of (error kind, detail) for a call; empty if the call fits the schema"""
+        signature = self.functions.get(function_name)
+        if signature is None:
+            return [(UNKNOWN_FUNCTION, function_name)]
+
+        errors = []
+        for name, value in arguments.items():
+            if name not in signature["parameters"]:
+                errors.append((UNKNOWN_ARGUMENT, name))
+            elif name in signature["enums"] and value not in signature["enums"][name]:
+                errors.append((ENUM_VIOLATION, f"{name}={value!r}"))
+        for name in signature["required"] - arguments.keys():
+            errors.append((MISSING_REQUIRED, name))
+        return errors